@@ -1,23 +1,41 @@
 
 import os
+import sys
 import json
+import bisect
 import hashlib
 import re
 import datetime
-from textstat import flesch_kincaid_grade
-
-
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from readability import text_stats, grades_from_counts, STAT_KEYS
+from history_store import open_history, append_metrics
+from manifest import file_fingerprint, load_manifest, save_manifest, is_unchanged
+from parsed_store import PARSED_NAME_RE, find_parsed_titles, load_parsed
+from graph_layout import compute_layout, layout_path, load_or_compute_layout
+from graph_analytics import GRAPH_FILES, update_graph_analytics
+
+
+DATA_DIR = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), '..', '..', 'ecfr_analysis', 'data'
+    )
+)
+# Bump whenever a change here alters the computed metrics, so cached
+# per-title results from an older version are recomputed
+ANALYSIS_VERSION = 3
+# Per-file metrics in the order they are written to metrics.json
+METRIC_FIELDS = ('word_count', 'checksum', 'readability')
 
 
 def extract_text(data):
-    # Recursively extract all text fields from nested sections
+    # Recursively extract all text fields from nested sections.
+    # Each level is assembled with a single join, so flattening stays linear
+    # in the size of the document instead of quadratic.
     if isinstance(data, dict):
-        text = ""
-        for v in data.values():
-            text += extract_text(v) + " "
-        return text.strip()
+        return " ".join(extract_text(v) for v in data.values()).strip()
     elif isinstance(data, list):
-        return " ".join([extract_text(item) for item in data])
+        return " ".join(extract_text(item) for item in data)
     elif isinstance(data, str):
         return data
     else:
@@ -28,101 +46,168 @@ def extract_text(data):
 
 
 def save_metrics_history(metrics, processed_dir):
-    history_path = os.path.join(processed_dir, 'metrics_history.json')
+    # Append one row per file to the history store instead of rewriting
+    # the whole history on every run
     timestamp = datetime.datetime.now().isoformat()
-    entry = {'timestamp': timestamp, 'metrics': metrics}
-    # Load existing history
-    if os.path.exists(history_path):
-        with open(history_path, 'r', encoding='utf-8') as f:
-            history = json.load(f)
-    else:
-        history = []
-    history.append(entry)
-    with open(history_path, 'w', encoding='utf-8') as f:
-        json.dump(history, f, indent=2)
+    conn = open_history(processed_dir)
+    try:
+        append_metrics(conn, metrics, timestamp)
+    finally:
+        conn.close()
 
 
 
 
-def analyze():
-    metrics = {}
-    base_dir = os.path.abspath(
-        os.path.join(
-            os.path.dirname(__file__), '..', '..', 'ecfr_analysis', 'data'
-        )
-    )
+def compute_file_metrics(path):
+    # Worker for analyze(): load one file and compute all of its metrics.
+    # Parsed titles take their totals from the section rollup; other JSON
+    # files are scored from their flattened text.
+    data = load_parsed(path)
+    text = extract_text(data)
+    if isinstance(data, dict) and 'parts' in data:
+        totals = rollup_metrics(data)['title']
+    else:
+        totals = stats_row({key: values[0] for key, values in text_stats([text]).items()})
+    return {
+        "word_count": totals['word_count'],
+        "checksum": hashlib.md5(text.encode()).hexdigest(),
+        "readability": totals['readability']
+    }
+
+
+def analyze(workers=None, base_dir=DATA_DIR, use_cache=True):
     raw_dir = os.path.join(base_dir, 'raw')
     processed_dir = os.path.join(base_dir, 'processed')
-  
+    cache_path = os.path.join(base_dir, 'cache', 'metrics_cache.json')
+
     os.makedirs(processed_dir, exist_ok=True)
     metrics_path = os.path.join(processed_dir, 'metrics.json')
-    for fname in os.listdir(raw_dir):
-        if not fname.endswith('.json'):
-            continue
-        with open(os.path.join(raw_dir, fname), "r", encoding="utf-8") as f:
-            data = json.load(f)
-        text = extract_text(data)
-        wc = len(text.split())
-        checksum = hashlib.md5(text.encode()).hexdigest()
-        readability = flesch_kincaid_grade(text)
-        metrics[fname] = {
-            "word_count": wc,
-            "checksum": checksum,
-            "readability": readability
-        }
+    # Plain .json files plus one parsed file per title in whichever storage
+    # format is newest
+    parsed = {os.path.basename(path) for _, path in find_parsed_titles(raw_dir)}
+    fnames = [
+        fname for fname in os.listdir(raw_dir)
+        if fname in parsed or (fname.endswith('.json') and not PARSED_NAME_RE.fullmatch(fname))
+    ]
+    paths = {fname: os.path.join(raw_dir, fname) for fname in fnames}
+    # Reuse cached metrics for files whose content and analysis version
+    # are unchanged; only the misses are recomputed
+    cache = load_manifest(cache_path) if use_cache else {}
+    results = {}
+    misses = []
+    for fname in fnames:
+        entry = cache.get(fname)
+        if (entry and entry.get('analysis_version') == ANALYSIS_VERSION
+                and is_unchanged(paths[fname], entry)):
+            # The cache is saved with sorted keys; restore the field order
+            # so metrics.json is byte-identical whether or not a file hit
+            results[fname] = {key: entry['metrics'][key] for key in METRIC_FIELDS}
+        else:
+            misses.append(fname)
+    print(f"Metrics cache: {len(fnames) - len(misses)} hits, {len(misses)} misses")
+    if misses:
+        print(f"Recomputing metrics for: {sorted(misses)}")
+    if workers == 1 or len(misses) < 2:
+        for fname in misses:
+            results[fname] = compute_file_metrics(paths[fname])
+    else:
+        # Largest files first so the biggest title doesn't finish last
+        ordered = sorted(misses, key=lambda fname: os.path.getsize(paths[fname]), reverse=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for fname, file_metrics in zip(ordered, pool.map(compute_file_metrics, [paths[f] for f in ordered])):
+                results[fname] = file_metrics
+    for fname in misses:
+        entry = file_fingerprint(paths[fname])
+        entry['analysis_version'] = ANALYSIS_VERSION
+        entry['metrics'] = results[fname]
+        cache[fname] = entry
+    if use_cache:
+        # Drop entries for files that no longer exist
+        save_manifest({fname: cache[fname] for fname in fnames}, cache_path)
+    # Keep the directory listing order for metrics.json
+    metrics = {fname: results[fname] for fname in fnames}
     # Save metrics to metrics.json
     with open(metrics_path, 'w', encoding='utf-8') as out:
         json.dump(metrics, out, indent=2)
-    # Save to metrics_history.json
+    # Append to the metrics history store
     save_metrics_history(metrics, processed_dir)
 
 
 
 
 
-def extract_cross_references(parsed_json_path, output_path):
-    part_ref_re = re.compile(r"part\s*\d+", re.IGNORECASE)
-    with open(parsed_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    cross_refs = []
-    # Improved regex patterns with word boundaries and expanded types
-    section_ref_re = re.compile(
-        r"\b(?:§|section)\s*\d+(?:\.\d+)?\b", re.IGNORECASE
-    )
-    subpart_ref_re = re.compile(r"\bsubpart\s*[A-Z]+\b", re.IGNORECASE)
-    appendix_ref_re = re.compile(r"\bappendix\s*[A-Z]+\b", re.IGNORECASE)
+# Every reference type in one alternation with a named group per type.
+# The leading lookaheads let the engine skip positions that cannot start a
+# reference before trying the alternatives.
+REFERENCE_RE = re.compile(
+    r"(?=[§\dapst])(?=[§\d]|se|su|pa|ap|ti)(?:"
+    r"(?P<section>\b(?:§|section)\s*\d+(?:\.\d+)?\b)"
+    r"|(?P<part>part\s*\d+)"
+    r"|(?P<subpart>\bsubpart\s*[A-Z]+\b)"
+    r"|(?P<appendix>\bappendix\s*[A-Z]+\b)"
+    r"|(?P<title>\btitle\s*\d+\b)"
+    r"|(?P<usc>\b\d+\s*U\.S\.C\.(?:\s*§)?\s*\d+\b)"
+    r")",
+    re.IGNORECASE
+)
+CONTEXT_RE = re.compile(
+    r"(see|as provided in|as described in|according to|under|pursuant to|in accordance with)",
+    re.IGNORECASE
+)
+
+
+def scan_references(para):
+    # Single pass over para returning typed matches as
+    # [(kind, text, start, end), ...]. References of different kinds can
+    # overlap ('title 5' and '5 U.S.C. 552'), so scanning resumes one
+    # character after each match start; references of the same kind never
+    # overlap, matching what a findall per kind would return.
+    matches = []
+    last_end = {}
+    pos = 0
+    search = REFERENCE_RE.search
+    while True:
+        m = search(para, pos)
+        if m is None:
+            return matches
+        kind = m.lastgroup
+        start, end = m.span()
+        pos = start + 1
+        if start < last_end.get(kind, 0):
+            continue
+        last_end[kind] = end
+        matches.append((kind, m.group(), start, end))
 
-    title_ref_re = re.compile(r"\btitle\s*\d+\b", re.IGNORECASE)
-    usc_ref_re = re.compile(
-        r"\b\d+\s*U\.S\.C\.(?:\s*§)?\s*\d+\b", re.IGNORECASE
-    )
-    context_re = re.compile(
-        r"(see|as provided in|as described in|according to|under|pursuant to|in accordance with)",
-        re.IGNORECASE
-    )
+
+def iter_cross_references(data):
+    # Cross-references one paragraph at a time, for consumers that never
+    # need the whole list (see count_citations_stream)
     for part in data.get('parts', []):
         part_heading = part.get('part_heading', '')
-  
+
         for section in part.get('sections', []):
             section_heading = section.get('heading', '')
             for para in section.get('paragraphs', []):
                 # Only extract if a contextual phrase is present
-                if not context_re.search(para):
+                if not CONTEXT_RE.search(para):
                     continue
-                refs = set()
-                refs.update(section_ref_re.findall(para))
-                refs.update(part_ref_re.findall(para))
-                refs.update(subpart_ref_re.findall(para))
-                refs.update(appendix_ref_re.findall(para))
-                refs.update(title_ref_re.findall(para))
-                refs.update(usc_ref_re.findall(para))
+                refs = {text for _, text, _, _ in scan_references(para)}
                 if refs:
-                    cross_refs.append({
+                    yield {
                         'part_heading': part_heading,
                         'section_heading': section_heading,
                         'paragraph': para,
                         'references': sorted(refs)
-                    })
+                    }
+
+
+def find_cross_references(data):
+    return list(iter_cross_references(data))
+
+
+def extract_cross_references(parsed_json_path, output_path):
+    data = load_parsed(parsed_json_path)
+    cross_refs = find_cross_references(data)
     with open(output_path, 'w', encoding='utf-8') as out:
         json.dump(cross_refs, out, indent=2)
 
@@ -130,11 +215,7 @@ def extract_cross_references(parsed_json_path, output_path):
 
 
 
-def resolve_and_count_citations(parsed_json_path, crossref_path, output_path):
-    with open(parsed_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    with open(crossref_path, 'r', encoding='utf-8') as f:
-        cross_refs = json.load(f)
+def count_citations(data, cross_refs):
     # Build lookup for section and part headings
     section_lookup = {}
     part_lookup = {}
@@ -169,22 +250,79 @@ def resolve_and_count_citations(parsed_json_path, crossref_path, output_path):
                 'reference': r,
                 'resolved_to': resolved
             })
-    # Output
-    with open(output_path, 'w', encoding='utf-8') as out:
-        json.dump({
-            'citation_counts': citation_counts,
-            'resolved_references': resolved_refs
-        }, out, indent=2)
-
-
-  
-
-
-def generate_cross_reference_graph(parsed_json_path, crossref_path, output_path):
-    with open(parsed_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    return {
+        'citation_counts': citation_counts,
+        'resolved_references': resolved_refs
+    }
+
+
+def resolve_and_count_citations(parsed_json_path, crossref_path, output_path, stream=False,
+                                records_path=None):
+    # stream=True counts typed keys with count_citations_stream instead of
+    # keeping one resolved_references entry per occurrence; cross-references
+    # are then extracted on the fly when crossref_path is None, and
+    # per-occurrence records go to records_path (JSON Lines) if given
+    data = load_parsed(parsed_json_path)
+    if stream:
+        title_match = PARSED_NAME_RE.search(os.path.basename(parsed_json_path))
+        title_num = title_match.group(1) if title_match else None
+        if crossref_path is None:
+            cross_refs = iter_cross_references(data)
+        else:
+            with open(crossref_path, 'r', encoding='utf-8') as f:
+                cross_refs = json.load(f)
+        records = CitationRecordWriter(records_path) if records_path else None
+        try:
+            counts = count_citations_stream(cross_refs, title_num, records=records)
+        finally:
+            if records is not None:
+                records.close()
+        write_citation_counts(counts, output_path, heading_labels(data, title_num))
+        return
     with open(crossref_path, 'r', encoding='utf-8') as f:
         cross_refs = json.load(f)
+    # Output
+    with open(output_path, 'w', encoding='utf-8') as out:
+        json.dump(count_citations(data, cross_refs), out, indent=2)
+
+
+
+
+
+def build_citation_index(nodes):
+    # Sorted index of lowercased node ids. Every id that starts with a given
+    # reference forms one contiguous run of the sorted list, so a lookup is
+    # a bisect plus a walk over that run instead of a scan of every node.
+    ordered = sorted((n['id'].lower(), i) for i, n in enumerate(nodes))
+    return {
+        'keys': [key for key, _ in ordered],
+        'positions': [i for _, i in ordered],
+        'nodes': nodes,
+        'resolved': {}
+    }
+
+
+def resolve_citation(index, target):
+    # Same result as the first node (in node order) whose id starts with
+    # target, case-insensitively; None when nothing matches
+    target = target.lower()
+    resolved = index['resolved']
+    if target in resolved:
+        return resolved[target]
+    keys = index['keys']
+    j = bisect.bisect_left(keys, target)
+    first = None
+    while j < len(keys) and keys[j].startswith(target):
+        pos = index['positions'][j]
+        if first is None or pos < first:
+            first = pos
+        j += 1
+    node_id = index['nodes'][first]['id'] if first is not None else None
+    resolved[target] = node_id
+    return node_id
+
+
+def build_cross_reference_graph(data, cross_refs):
     # Build nodes for all sections and parts
     nodes = []
     node_ids = set()
@@ -203,105 +341,417 @@ def generate_cross_reference_graph(parsed_json_path, crossref_path, output_path)
                 })
                 node_ids.add(section_heading)
     # Build edges from cross-references
+    index = build_citation_index(nodes)
     edges = []
     for ref in cross_refs:
         source = ref['section_heading']
         for target in ref['references']:
             # Try to resolve to a node id (section or part)
-            target_id = None
-            for n in nodes:
-                if n['id'].lower().startswith(target.lower()):
-                    target_id = n['id']
-                    break
-            if target_id:
-                edges.append({
-                    'source': source,
-                    'target': target_id,
-                    'label': f"{source} references {target_id}"
-                })
-            else:
-                edges.append({
-                    'source': source,
-                    'target': target,
-                    'label': f"{source} references {target}"
-                })
+            target_id = resolve_citation(index, target) or target
+            edges.append({
+                'source': source,
+                'target': target_id,
+                'label': f"{source} references {target_id}"
+            })
+    return {'nodes': nodes, 'edges': edges}
+
+
+def generate_cross_reference_graph(parsed_json_path, crossref_path, output_path):
+    data = load_parsed(parsed_json_path)
+    with open(crossref_path, 'r', encoding='utf-8') as f:
+        cross_refs = json.load(f)
+    graph = build_cross_reference_graph(data, cross_refs)
     with open(output_path, 'w', encoding='utf-8') as out:
-        json.dump({'nodes': nodes, 'edges': edges}, out, indent=2)
+        json.dump(graph, out, indent=2)
 
 
 
 
 
-def compute_part_section_metrics(parsed_json_path, output_path):
-    with open(parsed_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    results = []
+def stats_row(stats):
+    # word_count and readability from summed sufficient statistics
+    words = int(stats['words'])
+    readability = grades_from_counts(words, stats['sentences'], stats['syllables'])
+    return {
+        'word_count': int(stats['tokens']),
+        'readability': float(readability) if words else 0
+    }
+
+
+def rollup_metrics(data):
+    # Tokenize every section (and heading) once, then derive part and title
+    # metrics by summing the sections' sufficient statistics instead of
+    # re-tokenizing their concatenated text. Parsed titles carry no chapter
+    # structure, so parts roll up directly into the title.
+    texts = []
+    layout = []
     for part in data.get('parts', []):
-        part_heading = part.get('part_heading', '')
-        part_text = ''
-        for section in part.get('sections', []):
-            for para in section.get('paragraphs', []):
-                part_text += para + ' '
-        part_word_count = len(part_text.split())
-        part_readability = (
-            flesch_kincaid_grade(part_text) if part_text else 0
-        )
-        results.append({
-            'level': 'part',
-            'part_heading': part_heading,
-            'section_heading': '',
-            'word_count': part_word_count,
-            'readability': part_readability
-        })
+        texts.append(part.get('part_heading', ''))
+        sections = []
         for section in part.get('sections', []):
-            section_heading = section.get('heading', '')
-            section_text = ' '.join(section.get('paragraphs', []))
-            section_word_count = len(section_text.split())
-            section_readability = (
-                flesch_kincaid_grade(section_text) if section_text else 0
-            )
-            results.append({
-                'level': 'section',
-                'part_heading': part_heading,
-                'section_heading': section_heading,
-                'word_count': section_word_count,
-                'readability': section_readability
-            })
+            texts.append(section.get('heading', ''))
+            texts.append(' '.join(section.get('paragraphs', [])))
+            sections.append((section.get('heading', ''), len(texts) - 1))
+        layout.append((part.get('part_heading', ''), sections))
+    stats = text_stats(texts)
+    rows = []
+    for part_heading, sections in layout:
+        body = [index for _, index in sections]
+        part_stats = {key: stats[key][body].sum() for key in STAT_KEYS}
+        rows.append(dict(
+            {'level': 'part', 'part_heading': part_heading, 'section_heading': ''},
+            **stats_row(part_stats)
+        ))
+        for section_heading, index in sections:
+            rows.append(dict(
+                {'level': 'section', 'part_heading': part_heading, 'section_heading': section_heading},
+                **stats_row({key: stats[key][index] for key in STAT_KEYS})
+            ))
+    # Title totals include headings, matching the text analyze() checksums
+    title_stats = {key: stats[key].sum() for key in STAT_KEYS}
+    return {'rows': rows, 'title': dict(stats_row(title_stats), bytes=int(title_stats['bytes']))}
+
+
+def part_section_metrics(data):
+    return rollup_metrics(data)['rows']
+
+
+def compute_part_section_metrics(parsed_json_path, output_path):
+    data = load_parsed(parsed_json_path)
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2)
+        json.dump(part_section_metrics(data), f, indent=2)
+
+
+
+# Post-processing stages for one parsed title, in run order:
+# (name, output file, input stages, function of the in-memory results)
+PIPELINE_STAGES = [
+    ('cross_references', 'cross_references.json', [],
+     lambda results: find_cross_references(results['data'])),
+    ('citation_counts', 'citation_counts.json', ['cross_references'],
+     lambda results: count_citations(results['data'], results['cross_references'])),
+    ('cross_reference_graph', 'cross_reference_graph.json', ['cross_references'],
+     lambda results: build_cross_reference_graph(results['data'], results['cross_references'])),
+    ('cross_reference_graph_layout', 'cross_reference_graph_layout.json', ['cross_reference_graph'],
+     lambda results: compute_layout(results['cross_reference_graph'])),
+    ('part_section_metrics', 'part_section_metrics.json', [],
+     lambda results: part_section_metrics(results['data'])),
+]
+
+
+def run_title_pipeline(parsed_json_path, out_dir, stages=None, outputs=None):
+    # Load the title once and run the requested stages (default: all) in
+    # memory, pulling in any stage they depend on. Only the stages named in
+    # outputs (default: every stage that ran) are written, at the end, so
+    # intermediates like cross_references.json can be skipped.
+    results = {'data': load_parsed(parsed_json_path)}
+    wanted = set(stages or [name for name, _, _, _ in PIPELINE_STAGES])
+    for name, _, deps, _ in reversed(PIPELINE_STAGES):
+        if name in wanted:
+            wanted.update(deps)
+    for name, _, _, run in PIPELINE_STAGES:
+        if name in wanted:
+            results[name] = run(results)
+    os.makedirs(out_dir, exist_ok=True)
+    for name, filename, _, _ in PIPELINE_STAGES:
+        if name in wanted and (outputs is None or name in outputs):
+            with open(os.path.join(out_dir, filename), 'w', encoding='utf-8') as out:
+                json.dump(results[name], out, indent=2)
+    return results
+
+
+def corpus_title_job(parsed_json_path, out_dir, outputs=None):
+    # Worker for analyze_corpus(): run the pipeline for one title and return
+    # just what the global graph merge needs
+    results = run_title_pipeline(parsed_json_path, out_dir, outputs=outputs)
+    return {
+        'nodes': results['cross_reference_graph']['nodes'],
+        'cross_references': [
+            {'section_heading': ref['section_heading'], 'references': ref['references'],
+             'us_code': cites_us_code(ref)}
+            for ref in results['cross_references']
+        ]
+    }
+
+
+CITATION_KEY_PATTERNS = [
+    ('usc', re.compile(r"(\d+)\s*U\.S\.C\.(?:\s*§)?\s*(\d+)", re.IGNORECASE)),
+    ('section', re.compile(r"(?:§|section)\s*(\d+(?:\.\d+)?)", re.IGNORECASE)),
+    ('subpart', re.compile(r"subpart\s*([A-Z]+)", re.IGNORECASE)),
+    ('appendix', re.compile(r"appendix\s*([A-Z]+)", re.IGNORECASE)),
+    ('part', re.compile(r"part\s*(\d+)", re.IGNORECASE)),
+    ('title', re.compile(r"title\s*(\d+)", re.IGNORECASE)),
+]
+
+
+def citation_key(ref):
+    # Normalize a reference or heading to a typed key, e.g. 'section 1.1',
+    # '§ 1.1   Definitions.' -> ('section', '1.1'); 'PART 60—...' -> ('part', '60')
+    for kind, pattern in CITATION_KEY_PATTERNS:
+        m = pattern.match(ref.strip())
+        if m:
+            return (kind, ' '.join(g.upper() for g in m.groups()))
+    return None
+
+
+# A paragraph citing the U.S. Code ("section 552 of title 5, United States
+# Code") names U.S. Code titles, not CFR titles
+US_CODE_RE = re.compile(r"United\s+States\s+Code|U\.S\.C\.|U\.S\.\s*Code", re.IGNORECASE)
+
+
+def cites_us_code(ref):
+    # corpus_title_job passes the flag instead of the paragraph text
+    if 'us_code' in ref:
+        return ref['us_code']
+    return bool(US_CODE_RE.search(ref.get('paragraph', '')))
+
+
+def is_cfr_citation(key):
+    # Parts, subparts, appendices and part.section numbers; sections
+    # without a dot ('section 212') are statute sections
+    kind, value = key
+    return kind in ('part', 'subpart', 'appendix') or (kind == 'section' and '.' in value)
+
+
+def reference_keys(ref, title_num, titles=None):
+    # [(reference, typed key or None, CFR title or None)] for one
+    # cross-reference entry. "title N" is a CFR title unless the paragraph
+    # cites the U.S. Code, where it is keyed ('usc', N). CFR citations
+    # belong to the one CFR title the paragraph names ("part 60 of title
+    # 40"; only titles in `titles`, if given), otherwise to title_num;
+    # other references get no CFR title.
+    us_code = cites_us_code(ref)
+    keys = []
+    for r in ref['references']:
+        key = citation_key(r)
+        if key and key[0] == 'title' and us_code:
+            key = ('usc', key[1])
+        keys.append(key)
+    mentioned = {key[1] for key in keys if key and key[0] == 'title'}
+    if len(mentioned) == 1 and (titles is None or mentioned <= titles):
+        context = mentioned.pop()
+    else:
+        context = title_num
+    return [
+        (r, key, context if key and is_cfr_citation(key) else None)
+        for r, key in zip(ref['references'], keys)
+    ]
+
+
+def format_citation_key(ref, key, cfr_title=None):
+    # Counting key for a reference and its citation_key. CFR citations
+    # carry their CFR title when it is known; sections without a dot are
+    # statute sections, not CFR sections:
+    #   ('section', '1.1') in Title 40 -> '40 CFR section 1.1'
+    #   ('section', '212') -> 'statute section 212'
+    #   ('usc', '5 552') -> 'usc 5 552'; ('title', '5') -> 'title 5'
+    # References without a key are kept verbatim under 'other'.
+    if key is None:
+        return f'other {ref.strip()}'
+    kind, value = key
+    if kind == 'section' and '.' not in value:
+        return f'statute section {value}'
+    if cfr_title is not None and is_cfr_citation(key):
+        return f'{cfr_title} CFR {kind} {value}'
+    return f'{kind} {value}'
+
+
+def typed_citation_key(ref, title_num=None):
+    # Normalized key for a single reference or heading, with CFR citations
+    # placed in title_num:
+    #   'section 1.1', '§ 1.1', '§ 1.1   Definitions.' (Title 40) -> '40 CFR section 1.1'
+    return format_citation_key(ref, citation_key(ref), title_num)
+
+
+class CitationRecordWriter:
+    # Per-occurrence citation records as JSON Lines, buffered and written
+    # chunk_size records at a time so they never pile up in memory
+    def __init__(self, path, chunk_size=10000):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.chunk_size = chunk_size
+        self.buffer = []
+
+    def add(self, record):
+        self.buffer.append(json.dumps(record) + '\n')
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        self.file.writelines(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def count_citations_stream(cross_refs, title_num=None, counts=None, records=None):
+    # Consume cross-references from any iterable (a generator, a list, one
+    # title after another) into a Counter of typed keys. Memory grows with
+    # the number of distinct keys, not with the number of citations. Pass
+    # `counts` to keep adding to an existing Counter and a
+    # CitationRecordWriter as `records` to keep every occurrence on disk.
+    # References are keyed as in build_global_graph (see reference_keys):
+    # U.S. Code titles are 'usc' keys, and a paragraph naming exactly one
+    # CFR title ("part 60 of title 40") places its CFR citations there.
+    counts = Counter() if counts is None else counts
+    for ref in cross_refs:
+        for r, citation, cfr_title in reference_keys(ref, title_num):
+            key = format_citation_key(r, citation, cfr_title)
+            counts[key] += 1
+            if records is not None:
+                records.add({
+                    'title': title_num,
+                    'section_heading': ref['section_heading'],
+                    'reference': r,
+                    'key': key
+                })
+    return counts
+
+
+def heading_labels(data, title_num=None):
+    # Typed key -> part/section heading, to show resolved citations by name
+    labels = {}
+    for part in data.get('parts', []):
+        headings = [part.get('part_heading', '')] + [s.get('heading', '') for s in part.get('sections', [])]
+        for heading in headings:
+            if heading and citation_key(heading):
+                labels.setdefault(typed_citation_key(heading, title_num), heading)
+    return labels
+
+
+def write_citation_counts(counts, output_path, labels=None):
+    # Compact JSON, most cited first: 'typed_counts' by normalized key and,
+    # when heading labels are given, 'citation_counts' by heading (or key
+    # for citations that do not resolve to a heading) for the dashboard
+    ranked = counts.most_common()
+    result = {'typed_counts': dict(ranked)}
+    if labels is not None:
+        result['citation_counts'] = {labels.get(key, key): count for key, count in ranked}
+    with open(output_path, 'w', encoding='utf-8') as out:
+        json.dump(result, out, separators=(',', ':'))
+
+
+def parsed_title_files(raw_dir):
+    # [(title number, path)] for every parsed title in any storage format,
+    # largest first
+    files = find_parsed_titles(raw_dir)
+    files.sort(key=lambda item: os.path.getsize(item[1]), reverse=True)
+    return files
+
+
+def build_global_graph(title_results):
+    # Merge per-title graphs into one CFR-wide graph. Node ids are prefixed
+    # with their title ('40 CFR PART 60—...'), each title gets a 'Title N'
+    # node, and part/section references resolve into the CFR title named
+    # elsewhere in the same paragraph (e.g. "part 60 of title 40"; see
+    # reference_keys). U.S. Code titles do not link to CFR title nodes.
+    nodes = []
+    by_key = {}
+    title_refs = {}
+    for title_num, result in sorted(title_results.items(), key=lambda item: int(item[0])):
+        title_refs[title_num] = result['cross_references']
+        title_id = f'Title {title_num}'
+        nodes.append({'id': title_id, 'type': 'title', 'title': title_num})
+        by_key[(title_num, 'title', title_num)] = title_id
+        for node in result['nodes']:
+            global_node = dict(node, id=f"{title_num} CFR {node['id']}", title=title_num)
+            if 'part' in node:
+                global_node['part'] = f"{title_num} CFR {node['part']}"
+            nodes.append(global_node)
+            key = citation_key(node['id'])
+            if key and key[0] in ('part', 'section'):
+                by_key.setdefault((title_num,) + key, global_node['id'])
+    titles = set(title_results)
+    edges = []
+    for title_num, cross_refs in title_refs.items():
+        for ref in cross_refs:
+            source = f"{title_num} CFR {ref['section_heading']}"
+            for r, key, cfr_title in reference_keys(ref, title_num, titles):
+                target_id = None
+                if key and key[0] == 'title':
+                    target_id = by_key.get((key[1], 'title', key[1]))
+                elif cfr_title is not None and key[0] in ('part', 'section'):
+                    target_id = by_key.get((cfr_title,) + key) or by_key.get((title_num,) + key)
+                elif key and key[0] == 'usc' and 'U.S.C' not in r.upper():
+                    # A U.S. Code title; keep it apart from the 'Title N' nodes
+                    target_id = f"{key[1]} U.S.C."
+                target_id = target_id or r
+                edges.append({
+                    'source': source,
+                    'target': target_id,
+                    'label': f"{source} references {target_id}"
+                })
+    return {'nodes': nodes, 'edges': edges}
+
+
+def analyze_corpus(workers=None, base_dir=DATA_DIR, outputs=None, citation_records=False):
+    # Run the per-title pipeline for every parsed title in parallel, then
+    # merge the per-title graphs into cross_reference_graph_global.json and
+    # count citations CFR-wide into citation_counts_global.json (plus one
+    # line per citation in citation_records_global.jsonl if requested)
+    raw_dir = os.path.join(base_dir, 'raw')
+    processed_dir = os.path.join(base_dir, 'processed')
+    titles_dir = os.path.join(processed_dir, 'titles')
+    title_results = {}
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(corpus_title_job, path, os.path.join(titles_dir, f'title{title_num}'), outputs): title_num
+            for title_num, path in parsed_title_files(raw_dir)
+        }
+        for future in as_completed(futures):
+            title_num = futures[future]
+            try:
+                title_results[title_num] = future.result()
+            except Exception as e:
+                failed.append(title_num)
+                print(f"Failed to analyze Title {title_num}: {e}")
+    graph = build_global_graph(title_results)
+    graph_path = os.path.join(processed_dir, 'cross_reference_graph_global.json')
+    with open(graph_path, 'w', encoding='utf-8') as out:
+        json.dump(graph, out, indent=2)
+    with open(layout_path(graph_path), 'w', encoding='utf-8') as out:
+        json.dump(compute_layout(graph), out)
+    records = (CitationRecordWriter(os.path.join(processed_dir, 'citation_records_global.jsonl'))
+               if citation_records else None)
+    counts = Counter()
+    try:
+        for title_num in sorted(title_results, key=int):
+            count_citations_stream(title_results[title_num]['cross_references'], title_num,
+                                   counts=counts, records=records)
+    finally:
+        if records is not None:
+            records.close()
+    write_citation_counts(counts, os.path.join(processed_dir, 'citation_counts_global.json'))
+    print(f"Analyzed {len(title_results)} titles ({len(failed)} failed); "
+          f"global graph: {len(graph['nodes'])} nodes, {len(graph['edges'])} edges -> {graph_path}")
+    return graph_path
 
 
 
 if __name__ == "__main__":
+    args = sys.argv[1:]
+    # --no-intermediate skips writing cross_references.json
+    outputs = None
+    if '--no-intermediate' in args:
+        outputs = [name for name, _, _, _ in PIPELINE_STAGES if name != 'cross_references']
     analyze()
-    # Cross-reference extraction for title1_parsed.json
-    base_dir = os.path.abspath(
-        os.path.join(
-            os.path.dirname(__file__), '..', '..', 'ecfr_analysis', 'data'
-        )
-    )
-    parsed_json_path = os.path.join(
-        base_dir, 'raw', 'title1_parsed.json'
-    )
-    crossref_output_path = os.path.join(
-        base_dir, 'processed', 'cross_references.json'
-    )
-    extract_cross_references(parsed_json_path, crossref_output_path)
-    citation_counts_path = os.path.join(
-        base_dir, 'processed', 'citation_counts.json'
-    )
-    resolve_and_count_citations(
-        parsed_json_path, crossref_output_path, citation_counts_path
-    )
-    graph_output_path = os.path.join(
-        base_dir, 'processed', 'cross_reference_graph.json'
-    )
-    generate_cross_reference_graph(
-        parsed_json_path, crossref_output_path, graph_output_path
-    )
-    part_section_metrics_path = os.path.join(
-        base_dir, 'processed', 'part_section_metrics.json'
-    )
-    compute_part_section_metrics(
-        parsed_json_path, part_section_metrics_path
-    )
+    # Cross-reference extraction for Title 1, in whichever format it is stored
+    title1 = dict(find_parsed_titles(os.path.join(DATA_DIR, 'raw'))).get('1')
+    if title1:
+        run_title_pipeline(title1, os.path.join(DATA_DIR, 'processed'), outputs=outputs)
+    else:
+        print("Title 1 has not been parsed; skipping its cross-reference pipeline")
+    if '--corpus' in args:
+        # Per-title outputs for every title plus the merged global graph
+        # --citation-records also keeps every citation occurrence on disk
+        analyze_corpus(outputs=outputs, citation_records='--citation-records' in args)
+    # Degree, PageRank, components and communities of the graphs just built
+    update_graph_analytics(os.path.join(DATA_DIR, 'processed'))
+    # Drawing layouts, so the API's layout endpoint only reads them
+    for filename in GRAPH_FILES.values():
+        graph_path = os.path.join(DATA_DIR, 'processed', filename)
+        if os.path.exists(graph_path):
+            with open(graph_path, 'r', encoding='utf-8') as f:
+                load_or_compute_layout(graph_path, json.load(f))
@@ -1,10 +1,102 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, Response, jsonify, request
 import json
 import os
+import gzip
+import hashlib
+import datetime
+from history_store import HISTORY_DB, open_history, query_history
+from search_index import SEARCH_DB, open_search_index, search
+from graph_index import build_graph_index, select_nodes, query_graph
+from graph_layout import load_or_compute_layout, layout_view
+from graph_analytics import (ANALYTICS_DB, GRAPH_FILES, SORT_COLUMNS as ANALYTICS_SORT_COLUMNS,
+                             open_analytics_store, query_central_nodes, graph_summary)
+from metrics_store import METRICS_DB, SORT_COLUMNS, open_metrics_store, query_metrics, metrics_facets
 
 app = Flask(__name__)
 
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'processed'))
+# Responses smaller than this are not worth compressing
+MIN_GZIP_SIZE = 1024
+# Largest page of edges /api/cross_reference_graph returns per request
+MAX_EDGE_PAGE = 5000
+LAYOUT_REDUCTIONS = ('degree', 'part')
+
+# Processed artifacts held in memory, keyed by filename. An entry is reused
+# until the file's size or mtime changes; its parsed JSON and gzipped body
+# are only built when first needed.
+_artifacts = {}
+
+def load_artifact(filename):
+    path = os.path.join(DATA_DIR, filename)
+    st = os.stat(path)
+    entry = _artifacts.get(filename)
+    if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+        return entry
+    with open(path, 'rb') as f:
+        body = f.read()
+    entry = {
+        'mtime_ns': st.st_mtime_ns,
+        'size': st.st_size,
+        'body': body,
+        'etag': hashlib.sha1(body).hexdigest(),
+        'last_modified': datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc),
+        'data': None,
+        'gzip': None,
+        'graph_index': None,
+        'layout': None
+    }
+    _artifacts[filename] = entry
+    return entry
+
+def artifact_data(entry):
+    if entry['data'] is None:
+        entry['data'] = json.loads(entry['body'])
+    return entry['data']
+
+def wants_gzip(body):
+    return len(body) >= MIN_GZIP_SIZE and 'gzip' in request.accept_encodings
+
+def json_response(body, etag, last_modified, gzipped=None):
+    # JSON response with ETag/Last-Modified validators, answered with 304
+    # when the client's copy is current. The gzip variant gets its own
+    # ETag so caches never mix up the two encodings.
+    use_gzip = wants_gzip(body)
+    if use_gzip:
+        body = gzipped if gzipped is not None else gzip.compress(body, compresslevel=6)
+        etag += '-gz'
+    response = Response(body, mimetype='application/json')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response.make_conditional(request)
+
+def send_artifact(filename):
+    try:
+        entry = load_artifact(filename)
+    except FileNotFoundError:
+        return jsonify({'error': f'{filename} not found'}), 404
+    if wants_gzip(entry['body']) and entry['gzip'] is None:
+        entry['gzip'] = gzip.compress(entry['body'], compresslevel=6)
+    return json_response(entry['body'], entry['etag'], entry['last_modified'], entry['gzip'])
+
+def not_modified(etag, last_modified):
+    # Conditional check done before building a derived response, so a
+    # client with a current copy costs no filtering or serialization.
+    # Returns a 304 response, or None when the response must be built.
+    if request.if_none_match:
+        for candidate in (etag, etag + '-gz'):
+            if request.if_none_match.contains(candidate):
+                response = Response(status=304)
+                response.set_etag(candidate)
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+        return None
+    if request.if_modified_since and last_modified.replace(microsecond=0) <= request.if_modified_since:
+        return Response(status=304)
+    return None
 
 @app.route('/')
 def index():
@@ -12,58 +104,259 @@ def index():
         'endpoints': [
             '/api/metrics',
             '/api/part_section_metrics',
+            '/api/part_section_metrics/rows',
+            '/api/part_section_metrics/facets',
             '/api/citation_counts',
             '/api/cross_references',
             '/api/cross_reference_graph',
-            '/api/metrics_history'
+            '/api/cross_reference_graph/layout',
+            '/api/cross_reference_graph/analytics',
+            '/api/metrics_history',
+            '/api/search'
         ]
     })
 
 @app.route('/api/metrics')
 def all_metrics():
-    return send_from_directory(DATA_DIR, 'metrics.json')
+    return send_artifact('metrics.json')
 
 @app.route('/api/part_section_metrics')
 def part_section_metrics():
-    return send_from_directory(DATA_DIR, 'part_section_metrics.json')
+    return send_artifact('part_section_metrics.json')
+
+def int_arg(name, default, minimum=0, maximum=None):
+    value = max(int(request.args.get(name, default)), minimum)
+    return min(value, maximum) if maximum is not None else value
+
+def float_arg(name):
+    value = request.args.get(name)
+    return float(value) if value not in (None, '') else None
+
+def store_response(db_name, open_store, build_hint, query):
+    # Run query(conn) against one of the SQLite stores in DATA_DIR.
+    # Responses are validated against the store file, so polling clients
+    # get 304s until the store is updated.
+    db_path = os.path.join(DATA_DIR, db_name)
+    if not os.path.exists(db_path):
+        return jsonify({'error': f'{db_name} not built; run {build_hint}'}), 503
+    st = os.stat(db_path)
+    last_modified = datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc)
+    query_key = json.dumps([request.path, st.st_mtime_ns, st.st_size, sorted(request.args.items(multi=True))])
+    etag = hashlib.sha1(query_key.encode('utf-8')).hexdigest()
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    conn = open_store(DATA_DIR)
+    try:
+        body = json.dumps(query(conn)).encode('utf-8')
+    finally:
+        conn.close()
+    return json_response(body, etag, last_modified)
+
+def metrics_store_response(query):
+    return store_response(METRICS_DB, open_metrics_store, 'backend/metrics_store.py', query)
+
+@app.route('/api/part_section_metrics/rows')
+def part_section_metrics_rows():
+    # Part/section metrics across titles, filtered, sorted and paged here:
+    #   title=<n> (repeatable), level=part|section, part=<heading> (repeatable),
+    #   min_readability, max_readability, sort=position|word_count|readability,
+    #   order=asc|desc, page, per_page
+    sort = request.args.get('sort', 'position')
+    if sort not in SORT_COLUMNS:
+        return jsonify({'error': f'sort must be one of {list(SORT_COLUMNS)}'}), 400
+    try:
+        titles = [int(t) for t in request.args.getlist('title')]
+        min_readability = float_arg('min_readability')
+        max_readability = float_arg('max_readability')
+        page = int_arg('page', 1, minimum=1)
+        per_page = int_arg('per_page', 20, minimum=1, maximum=500)
+    except ValueError:
+        return jsonify({'error': 'title, page and per_page must be integers; readability bounds numbers'}), 400
+    return metrics_store_response(lambda conn: query_metrics(
+        conn,
+        titles=titles,
+        level=request.args.get('level'),
+        parts=request.args.getlist('part'),
+        min_readability=min_readability,
+        max_readability=max_readability,
+        sort=sort,
+        ascending=request.args.get('order', 'asc') != 'desc',
+        page=page,
+        per_page=per_page
+    ))
+
+@app.route('/api/part_section_metrics/facets')
+def part_section_metrics_facets():
+    # Filter choices for ?title=<n> (repeatable) and optional level
+    try:
+        titles = [int(t) for t in request.args.getlist('title')]
+    except ValueError:
+        return jsonify({'error': 'title must be an integer'}), 400
+    return metrics_store_response(lambda conn: metrics_facets(conn, titles, request.args.get('level')))
 
 @app.route('/api/citation_counts')
 def citation_counts():
-    return send_from_directory(DATA_DIR, 'citation_counts.json')
+    return send_artifact('citation_counts.json')
 
 @app.route('/api/cross_references')
 def cross_references():
-    return send_from_directory(DATA_DIR, 'cross_references.json')
+    return send_artifact('cross_references.json')
+
+def artifact_graph_index(entry):
+    # Built once per loaded graph; a reloaded artifact starts without one
+    if entry.get('graph_index') is None:
+        entry['graph_index'] = build_graph_index(artifact_data(entry))
+    return entry['graph_index']
+
+def request_selection(index, hops, min_degree):
+    # Node positions matching the request's part/section/node filters
+    return select_nodes(
+        index,
+        parts=request.args.getlist('part'),
+        sections=request.args.getlist('section'),
+        node_id=request.args.get('node'),
+        hops=hops,
+        min_degree=min_degree
+    )
 
 @app.route('/api/cross_reference_graph')
 def cross_reference_graph():
-    graph_path = os.path.join(DATA_DIR, 'cross_reference_graph.json')
-    selected_parts = request.args.getlist('part')
-    selected_sections = request.args.getlist('section')
-    with open(graph_path, 'r', encoding='utf-8') as f:
-        graph = json.load(f)
-    if selected_parts or selected_sections:
-        filtered_nodes = [
-            node for node in graph['nodes']
-            if (not selected_parts or node.get('part') in selected_parts or (node.get('type') == 'part' and node.get('id') in selected_parts))
-            and (not selected_sections or node.get('section') in selected_sections or (node.get('type') == 'section' and node.get('id') in selected_sections))
-        ]
-        filtered_node_ids = {node['id'] for node in filtered_nodes}
-        filtered_edges = [
-            edge for edge in graph['edges']
-            if edge['source'] in filtered_node_ids and edge['target'] in filtered_node_ids
-        ]
-        filtered_graph = {
-            'nodes': filtered_nodes,
-            'edges': filtered_edges
-        }
-        return jsonify(filtered_graph)
-    else:
-        return jsonify(graph)
+    # Optional filters, all combinable:
+    #   part=<heading>, section=<heading> (repeatable)
+    #   node=<id>&hops=<k>     nodes within k references of a node (default 1)
+    #   min_degree=<n>         nodes with at least n references in or out
+    #   limit=<n>&cursor=<c>   page through the edges, following next_cursor
+    if not request.args:
+        return send_artifact('cross_reference_graph.json')
+    try:
+        hops = int_arg('hops', 1)
+        min_degree = int_arg('min_degree', 0)
+        cursor = int_arg('cursor', 0)
+        limit = int_arg('limit', 0, minimum=1, maximum=MAX_EDGE_PAGE) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'hops, min_degree, limit and cursor must be integers'}), 400
+    try:
+        entry = load_artifact('cross_reference_graph.json')
+    except FileNotFoundError:
+        return jsonify({'error': 'cross_reference_graph.json not found'}), 404
+    # A query result is current as long as the graph file and the query are
+    query_key = json.dumps(sorted(request.args.items(multi=True)))
+    etag = hashlib.sha1((entry['etag'] + query_key).encode('utf-8')).hexdigest()
+    response = not_modified(etag, entry['last_modified'])
+    if response is not None:
+        return response
+    index = artifact_graph_index(entry)
+    selected = request_selection(index, hops, min_degree)
+    result = query_graph(index, selected, limit=limit, cursor=cursor)
+    return json_response(json.dumps(result).encode('utf-8'), etag, entry['last_modified'])
+
+def artifact_layout(entry, filename):
+    # Node positions from the layout file analysis.py stores next to the
+    # graph; only computed here when that file is missing or stale
+    if entry.get('layout') is None:
+        entry['layout'] = load_or_compute_layout(os.path.join(DATA_DIR, filename), artifact_data(entry))
+    return entry['layout']
+
+@app.route('/api/cross_reference_graph/layout')
+def cross_reference_graph_layout():
+    # Positioned nodes and weighted edges ready for drawing:
+    #   graph=title|global     which graph file to draw (default title)
+    #   reduce=part            merge every section into its part
+    #   reduce=degree&max_nodes=<n>  keep the n best-connected nodes
+    # plus the part, section, node/hops and min_degree filters of
+    # /api/cross_reference_graph
+    filename = GRAPH_FILES.get(request.args.get('graph', 'title'))
+    if filename is None:
+        return jsonify({'error': f"graph must be one of {', '.join(GRAPH_FILES)}"}), 400
+    reduce = request.args.get('reduce') or None
+    if reduce is not None and reduce not in LAYOUT_REDUCTIONS:
+        return jsonify({'error': f"reduce must be one of {', '.join(LAYOUT_REDUCTIONS)}"}), 400
+    try:
+        hops = int_arg('hops', 1)
+        min_degree = int_arg('min_degree', 0)
+        max_nodes = int_arg('max_nodes', 0) or None
+    except ValueError:
+        return jsonify({'error': 'hops, min_degree and max_nodes must be integers'}), 400
+    try:
+        entry = load_artifact(filename)
+    except FileNotFoundError:
+        return jsonify({'error': f'{filename} not found'}), 404
+    query_key = json.dumps(sorted(request.args.items(multi=True)))
+    etag = hashlib.sha1((entry['etag'] + 'layout' + query_key).encode('utf-8')).hexdigest()
+    response = not_modified(etag, entry['last_modified'])
+    if response is not None:
+        return response
+    index = artifact_graph_index(entry)
+    view = layout_view(
+        artifact_data(entry),
+        index,
+        artifact_layout(entry, filename),
+        reduce=reduce,
+        max_nodes=max_nodes,
+        selected=request_selection(index, hops, min_degree)
+    )
+    return json_response(json.dumps(view, separators=(',', ':')).encode('utf-8'), etag, entry['last_modified'])
+
+@app.route('/api/cross_reference_graph/analytics')
+def cross_reference_graph_analytics():
+    # Precomputed node analytics, most central first:
+    #   graph=title|global, type=part|section|title, component=<n>,
+    #   community=<n>, sort=pagerank|in_degree|out_degree, order=asc|desc,
+    #   page, per_page
+    graph = request.args.get('graph', 'title')
+    if graph not in GRAPH_FILES:
+        return jsonify({'error': f"graph must be one of {', '.join(GRAPH_FILES)}"}), 400
+    sort = request.args.get('sort', 'pagerank')
+    if sort not in ANALYTICS_SORT_COLUMNS:
+        return jsonify({'error': f'sort must be one of {list(ANALYTICS_SORT_COLUMNS)}'}), 400
+    try:
+        component = int(request.args['component']) if request.args.get('component') else None
+        community = int(request.args['community']) if request.args.get('community') else None
+        page = int_arg('page', 1, minimum=1)
+        per_page = int_arg('per_page', 20, minimum=1, maximum=500)
+    except ValueError:
+        return jsonify({'error': 'component, community, page and per_page must be integers'}), 400
+
+    def query(conn):
+        result = query_central_nodes(
+            conn,
+            graph=graph,
+            node_type=request.args.get('type'),
+            component=component,
+            community=community,
+            sort=sort,
+            ascending=request.args.get('order', 'desc') == 'asc',
+            page=page,
+            per_page=per_page
+        )
+        result['summary'] = graph_summary(conn, graph)
+        return result
+    return store_response(ANALYTICS_DB, open_analytics_store, 'backend/graph_analytics.py', query)
 
 @app.route('/api/metrics_history')
 def metrics_history():
-    return send_from_directory(DATA_DIR, 'metrics_history.json')
+    # Optional filters: ?start=<iso timestamp>&end=<iso timestamp>&file=<name> (repeatable)
+    # The store is created (and migrated from JSON) by analysis.py, never here
+    return store_response(HISTORY_DB, open_history, 'backend/analysis.py', lambda conn: query_history(
+        conn,
+        start=request.args.get('start'),
+        end=request.args.get('end'),
+        files=request.args.getlist('file')
+    ))
+
+@app.route('/api/search')
+def search_paragraphs():
+    # ?q=<words>&page=<n>&per_page=<n>&title=<n> (repeatable)
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+        titles = [int(t) for t in request.args.getlist('title')]
+    except ValueError:
+        return jsonify({'error': 'page, per_page and title must be integers'}), 400
+    return store_response(SEARCH_DB, open_search_index, 'backend/search_index.py', lambda conn: search(
+        conn, request.args.get('q', ''), titles=titles, page=page, per_page=per_page
+    ))
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import re
+from analysis import (
+    extract_cross_references, build_cross_reference_graph,
+    CONTEXT_RE, scan_references
+)
+from parsed_store import FORMATS, find_parsed_titles, load_parsed, write_parsed, zstandard
+
+RAW_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'raw'))
+
+def largest_parsed_title(raw_dir=RAW_DIR):
+    paths = [path for _, path in find_parsed_titles(raw_dir)]
+    return max(paths, key=os.path.getsize)
+
+def timed(fn, *args, repeat=3):
+    # Best of `repeat` runs, in seconds, plus the result of the last run
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def load_title_and_refs(parsed_json_path):
+    data = load_parsed(parsed_json_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        crossref_path = os.path.join(tmp, 'cross_references.json')
+        extract_cross_references(parsed_json_path, crossref_path)
+        with open(crossref_path, 'r', encoding='utf-8') as f:
+            cross_refs = json.load(f)
+    return data, cross_refs
+
+def legacy_build_cross_reference_graph(data, cross_refs):
+    # The original linear-scan resolver, kept as the benchmark baseline
+    nodes = []
+    node_ids = set()
+    for part in data.get('parts', []):
+        part_heading = part.get('part_heading', '')
+        if part_heading and part_heading not in node_ids:
+            nodes.append({'id': part_heading, 'type': 'part'})
+            node_ids.add(part_heading)
+        for section in part.get('sections', []):
+            section_heading = section.get('heading', '')
+            if section_heading and section_heading not in node_ids:
+                nodes.append({'id': section_heading, 'type': 'section', 'part': part_heading})
+                node_ids.add(section_heading)
+    edges = []
+    for ref in cross_refs:
+        source = ref['section_heading']
+        for target in ref['references']:
+            target_id = None
+            for n in nodes:
+                if n['id'].lower().startswith(target.lower()):
+                    target_id = n['id']
+                    break
+            target_id = target_id or target
+            edges.append({'source': source, 'target': target_id,
+                          'label': f"{source} references {target_id}"})
+    return {'nodes': nodes, 'edges': edges}
+
+def bench_graph_resolution(parsed_json_path):
+    data, cross_refs = load_title_and_refs(parsed_json_path)
+    n_refs = sum(len(ref['references']) for ref in cross_refs)
+    legacy_time, legacy_graph = timed(legacy_build_cross_reference_graph, data, cross_refs)
+    indexed_time, indexed_graph = timed(build_cross_reference_graph, data, cross_refs)
+    assert legacy_graph == indexed_graph, "indexed resolver produced different edges"
+    print(f"Cross-reference graph: {os.path.basename(parsed_json_path)} "
+          f"({len(indexed_graph['nodes'])} nodes, {n_refs} references)")
+    print(f"  linear scan: {legacy_time * 1000:.1f} ms")
+    print(f"  indexed:     {indexed_time * 1000:.1f} ms ({legacy_time / indexed_time:.1f}x faster)")
+
+LEGACY_REFERENCE_RES = [
+    re.compile(r"\b(?:§|section)\s*\d+(?:\.\d+)?\b", re.IGNORECASE),
+    re.compile(r"part\s*\d+", re.IGNORECASE),
+    re.compile(r"\bsubpart\s*[A-Z]+\b", re.IGNORECASE),
+    re.compile(r"\bappendix\s*[A-Z]+\b", re.IGNORECASE),
+    re.compile(r"\btitle\s*\d+\b", re.IGNORECASE),
+    re.compile(r"\b\d+\s*U\.S\.C\.(?:\s*§)?\s*\d+\b", re.IGNORECASE),
+]
+
+def legacy_scan(paragraphs):
+    # The original scanner: context check plus one findall per reference type
+    results = []
+    for para in paragraphs:
+        refs = set()
+        if CONTEXT_RE.search(para):
+            for pattern in LEGACY_REFERENCE_RES:
+                refs.update(pattern.findall(para))
+        results.append(sorted(refs))
+    return results
+
+def combined_scan(paragraphs):
+    results = []
+    for para in paragraphs:
+        refs = set()
+        if CONTEXT_RE.search(para):
+            refs = {text for _, text, _, _ in scan_references(para)}
+        results.append(sorted(refs))
+    return results
+
+def bench_scanner(parsed_json_path):
+    data = load_parsed(parsed_json_path)
+    paragraphs = [
+        para
+        for part in data.get('parts', [])
+        for section in part.get('sections', [])
+        for para in section.get('paragraphs', [])
+    ]
+    legacy_time, legacy_refs = timed(legacy_scan, paragraphs, repeat=5)
+    combined_time, combined_refs = timed(combined_scan, paragraphs, repeat=5)
+    assert legacy_refs == combined_refs, "combined scanner found different references"
+    print(f"Reference scanner: {os.path.basename(parsed_json_path)} "
+          f"({len(paragraphs)} paragraphs, {sum(map(len, paragraphs)) / 1e6:.1f}M chars)")
+    print(f"  context + 6 findall: {legacy_time * 1000:.1f} ms")
+    print(f"  combined scanner:    {combined_time * 1000:.1f} ms ({legacy_time / combined_time:.2f}x faster)")
+
+def bench_storage(parsed_json_path):
+    # Size on disk and full load time of one title in each storage format
+    data = load_parsed(parsed_json_path)
+    formats = [fmt for fmt in FORMATS if fmt != 'json.zst' or zstandard is not None]
+    print(f"Parsed storage: {os.path.basename(parsed_json_path)}")
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for fmt in formats:
+            path = os.path.join(tmp, f'title_parsed.{fmt}')
+            write_time, _ = timed(write_parsed, data, path, repeat=1)
+            load_time, loaded = timed(load_parsed, path)
+            assert loaded == data, f"{fmt} round trip changed the data"
+            size = os.path.getsize(path)
+            baseline = baseline or size
+            print(f"  {fmt:<9} {size / 1e6:7.1f} MB ({baseline / size:4.1f}x smaller), "
+                  f"write {write_time * 1000:.0f} ms, load {load_time * 1000:.0f} ms")
+    if zstandard is None:
+        print("  json.zst  skipped (zstandard not installed)")
+
+BENCHMARKS = {
+    'graph': bench_graph_resolution,
+    'scanner': bench_scanner,
+    'storage': bench_storage,
+}
+
+if __name__ == "__main__":
+    # python benchmarks.py [benchmark ...] [--title path/to/titleN_parsed.json]
+    args = sys.argv[1:]
+    parsed_json_path = largest_parsed_title()
+    if '--title' in args:
+        i = args.index('--title')
+        parsed_json_path = args[i + 1]
+        del args[i:i + 2]
+    for name in args or BENCHMARKS:
+        BENCHMARKS[name](parsed_json_path)
@@ -0,0 +1,136 @@
+import os
+import sys
+from analysis import ANALYSIS_VERSION, DATA_DIR, parsed_title_files, rollup_metrics
+from parsed_store import load_parsed
+
+# pyarrow is optional: only the columnar export and its loaders need it
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+COLUMNAR_DIR = os.path.join(DATA_DIR, 'columnar')
+PARAGRAPHS = 'paragraphs'
+PART_SECTION_METRICS = 'part_section_metrics'
+# Schema metadata key recording the ANALYSIS_VERSION an export was written
+# with, so exports from an older metrics computation are not reused
+VERSION_KEY = b'analysis_version'
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar export needs pyarrow: pip install pyarrow")
+
+
+def paragraph_table(title_num, data):
+    # One row per paragraph with its position in the title
+    columns = {
+        'part_index': [], 'part_heading': [],
+        'section_index': [], 'section_heading': [],
+        'paragraph_index': [], 'text': []
+    }
+    for part_index, part in enumerate(data.get('parts', [])):
+        for section_index, section in enumerate(part.get('sections', [])):
+            for paragraph_index, para in enumerate(section.get('paragraphs', [])):
+                columns['part_index'].append(part_index)
+                columns['part_heading'].append(part.get('part_heading', ''))
+                columns['section_index'].append(section_index)
+                columns['section_heading'].append(section.get('heading', ''))
+                columns['paragraph_index'].append(paragraph_index)
+                columns['text'].append(para)
+    return pa.table({
+        'title': pa.array([int(title_num)] * len(columns['text']), pa.int32()),
+        'part_index': pa.array(columns['part_index'], pa.int32()),
+        'part_heading': pa.array(columns['part_heading'], pa.string()).dictionary_encode(),
+        'section_index': pa.array(columns['section_index'], pa.int32()),
+        'section_heading': pa.array(columns['section_heading'], pa.string()),
+        'paragraph_index': pa.array(columns['paragraph_index'], pa.int32()),
+        'text': pa.array(columns['text'], pa.string())
+    })
+
+
+def part_section_metrics_table(title_num, data):
+    # The rollup_metrics rows (parts followed by their sections), in order
+    rows = rollup_metrics(data)['rows']
+    return pa.table({
+        'title': pa.array([int(title_num)] * len(rows), pa.int32()),
+        'level': pa.array([row['level'] for row in rows], pa.string()).dictionary_encode(),
+        'part_heading': pa.array([row['part_heading'] for row in rows], pa.string()).dictionary_encode(),
+        'section_heading': pa.array([row['section_heading'] for row in rows], pa.string()),
+        'word_count': pa.array([row['word_count'] for row in rows], pa.int64()),
+        'readability': pa.array([row['readability'] for row in rows], pa.float64())
+    })
+
+
+def export_title(title_num, parsed_json_path, out_dir=COLUMNAR_DIR):
+    # Each title is its own file under a hive-style title=N directory, so
+    # loaders can prune by title without opening the others
+    require_pyarrow()
+    data = load_parsed(parsed_json_path)
+    for name, table in ((PARAGRAPHS, paragraph_table(title_num, data)),
+                        (PART_SECTION_METRICS, part_section_metrics_table(title_num, data))):
+        title_dir = os.path.join(out_dir, name, f'title={int(title_num)}')
+        os.makedirs(title_dir, exist_ok=True)
+        table = table.drop_columns(['title']).replace_schema_metadata(
+            {VERSION_KEY: str(ANALYSIS_VERSION).encode()}
+        )
+        pq.write_table(table, os.path.join(title_dir, 'part-0.parquet'), compression='zstd')
+
+
+def export_all(raw_dir=os.path.join(DATA_DIR, 'raw'), out_dir=COLUMNAR_DIR):
+    require_pyarrow()
+    titles = parsed_title_files(raw_dir)
+    for title_num, path in titles:
+        export_title(title_num, path, out_dir)
+        print(f"Exported Title {title_num} to {out_dir}")
+    print(f"Exported {len(titles)} titles")
+
+
+def title_file(name, title_num, out_dir=COLUMNAR_DIR):
+    return os.path.join(out_dir, name, f'title={int(title_num)}', 'part-0.parquet')
+
+
+def export_is_current(name, title_num, parsed_json_path, out_dir=COLUMNAR_DIR):
+    # True when pyarrow is available and the title's export is at least as
+    # new as its parsed file and was written by the current ANALYSIS_VERSION,
+    # so readers can use it instead of the JSON
+    path = title_file(name, title_num, out_dir)
+    if (pa is None or not os.path.exists(path)
+            or os.path.getmtime(path) < os.path.getmtime(parsed_json_path)):
+        return False
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(VERSION_KEY) == str(ANALYSIS_VERSION).encode()
+
+
+def _load(name, columns=None, titles=None, out_dir=COLUMNAR_DIR, filter_expr=None):
+    require_pyarrow()
+    dataset = ds.dataset(os.path.join(out_dir, name), format='parquet', partitioning='hive')
+    if titles:
+        title_filter = ds.field('title').isin([int(t) for t in titles])
+        filter_expr = title_filter if filter_expr is None else filter_expr & title_filter
+    return dataset.to_table(columns=columns, filter=filter_expr)
+
+
+def load_paragraphs(columns=None, titles=None, out_dir=COLUMNAR_DIR):
+    # e.g. load_paragraphs(['section_heading', 'text'], titles=[1, 40])
+    return _load(PARAGRAPHS, columns, titles, out_dir)
+
+
+def load_part_section_metrics(columns=None, titles=None, out_dir=COLUMNAR_DIR):
+    # Part and section rows as written by rollup_metrics, in document order
+    # within each title
+    return _load(PART_SECTION_METRICS, columns, titles, out_dir)
+
+
+def load_section_metrics(columns=None, titles=None, out_dir=COLUMNAR_DIR):
+    return _load(PART_SECTION_METRICS, columns, titles, out_dir, filter_expr=ds.field('level') == 'section')
+
+
+if __name__ == "__main__":
+    try:
+        export_all()
+    except ImportError as e:
+        print(e)
+        sys.exit(1)
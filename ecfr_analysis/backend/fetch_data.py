@@ -1,20 +1,53 @@
 
-import requests
 import os
 import json
 import time
+import argparse
+from fetcher import TokenBucket, make_session, request_with_retries, download_file, run_jobs
 
 OUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'ecfr_analysis', 'data', 'raw'))
 AGENCIES_URL = "https://www.ecfr.gov/api/admin/v1/agencies.json"
 # Example CFR endpoint: https://www.ecfr.gov/api/v1/current/title-7/chapter-I
 CFR_BASE_URL = "https://www.ecfr.gov/api/v1/current/title-{}/chapter-{}"
-DELAY_SECONDS = 1.5  # Adjust as needed to avoid rate limiting
+# Request rate limit; 429s are retried with backoff, honoring Retry-After
+REQUESTS_PER_SECOND = 1.0
 
-def fetch_agencies_and_cfr():
+def chapter_jobs(agencies, titles=None):
+    # Flatten the agency tree (parents and all descendants) into unique
+    # (title, chapter) pairs, in first-seen order. A chapter shared by a
+    # parent and its sub-agencies is fetched once. `titles` optionally
+    # restricts the crawl to some title numbers.
+    wanted = {str(t) for t in titles} if titles else None
+    jobs = []
+    seen = set()
+    stack = list(reversed(agencies))
+    while stack:
+        agency = stack.pop()
+        for ref in agency.get("cfr_references", []):
+            title = ref.get("title")
+            chapter = ref.get("chapter")
+            if not (title and chapter):
+                continue
+            key = (str(title), str(chapter))
+            if key in seen or (wanted and key[0] not in wanted):
+                continue
+            seen.add(key)
+            jobs.append(key)
+        stack.extend(reversed(agency.get("children", [])))
+    return jobs
+
+def fetch_chapter(session, bucket, title, chapter):
+    url = CFR_BASE_URL.format(title, chapter)
+    out_file = os.path.join(OUT_DIR, f"title_{title}_chapter_{chapter}.json")
+    return download_file(session, bucket, url, out_file)
+
+def fetch_agencies_and_cfr(workers=4, rate=REQUESTS_PER_SECOND, titles=None):
     print(f"OUT_DIR is: {OUT_DIR}")
     os.makedirs(OUT_DIR, exist_ok=True)
+    session = make_session(pool_size=workers)
+    bucket = TokenBucket(rate)
     # Fetch agencies list
-    r = requests.get(AGENCIES_URL)
+    r = request_with_retries(session, bucket, AGENCIES_URL)
     if r.status_code != 200:
         print(f"Failed to fetch agencies: Status {r.status_code}")
         return
@@ -23,50 +56,41 @@ def fetch_agencies_and_cfr():
         json.dump(agencies, f, indent=2)
     print("Saved agencies list to agencies.json")
 
-    def process_agency(agency):
-        # Fetch CFR data for each cfr_reference
-        for ref in agency.get("cfr_references", []):
-            title = ref.get("title")
-            chapter = ref.get("chapter")
-            if title and chapter:
-                url = CFR_BASE_URL.format(title, chapter)
-                print(f"Trying URL: {url}")
-                resp = requests.get(url)
-                print(f"Status for {url}: {resp.status_code}")
-                if resp.status_code == 200:
-                    out_file = os.path.join(OUT_DIR, f"title_{title}_chapter_{chapter}.json")
-                    with open(out_file, "w", encoding="utf-8") as f:
-                        json.dump(resp.json(), f)
-                    print(f"Saved Title {title} Chapter {chapter} to {out_file}")
-                elif resp.status_code == 404:
-                    print(f"Not found: Title {title} Chapter {chapter} (404)")
-                elif resp.status_code == 429:
-                    print(f"Rate limited (429). Waiting {DELAY_SECONDS*2} seconds and retrying...")
-                    time.sleep(DELAY_SECONDS*2)
-                    resp = requests.get(url)
-                    print(f"Retry status for {url}: {resp.status_code}")
-                    if resp.status_code == 200:
-                        out_file = os.path.join(OUT_DIR, f"title_{title}_chapter_{chapter}.json")
-                        with open(out_file, "w", encoding="utf-8") as f:
-                            json.dump(resp.json(), f)
-                        print(f"Saved Title {title} Chapter {chapter} to {out_file}")
-                    else:
-                        print(f"Failed after retry: Title {title} Chapter {chapter}: Status {resp.status_code}")
-                else:
-                    print(f"Failed to fetch Title {title} Chapter {chapter}: Status {resp.status_code}")
-                time.sleep(DELAY_SECONDS)
-        # Recursively process children
-        for child in agency.get("children", []):
-            process_agency(child)
-
-    # Only process agencies with a cfr_reference for title 1
-    for agency in agencies:
-        has_title_1 = any(ref.get("title") == "1" for ref in agency.get("cfr_references", []))
-        if has_title_1:
-            process_agency(agency)
-    # Commented out: process all agencies for all titles
-    # for agency in agencies:
-    #     process_agency(agency)
+    chapters = chapter_jobs(agencies, titles)
+    print(f"Fetching {len(chapters)} unique title/chapter pairs with {workers} workers")
+    start = time.perf_counter()
+    saved = []
+    not_found = []
+    failed = []
+    jobs = [(session, bucket, title, chapter) for title, chapter in chapters]
+    for done, (job, result, error) in enumerate(run_jobs(fetch_chapter, jobs, workers), 1):
+        title, chapter = job[2], job[3]
+        progress = f"[{done}/{len(jobs)}, {time.perf_counter() - start:.0f}s]"
+        if error is not None:
+            print(f"{progress} Failed to fetch Title {title} Chapter {chapter}: {error}")
+            failed.append((title, chapter))
+        elif result['saved']:
+            print(f"{progress} Saved Title {title} Chapter {chapter} to {result['path']}")
+            saved.append((title, chapter))
+        elif result['status'] == 404:
+            print(f"{progress} Not found: Title {title} Chapter {chapter} (404)")
+            not_found.append((title, chapter))
+        else:
+            print(f"{progress} Failed to fetch Title {title} Chapter {chapter}: Status {result['status']}")
+            failed.append((title, chapter))
+    print("\nSummary:")
+    print(f"  Chapters saved: {len(saved)}")
+    print(f"  Chapters not found: {len(not_found)}")
+    print(f"  Chapters failed: {len(failed)} -> {failed}")
+    return saved, not_found, failed
 
 if __name__ == "__main__":
-    fetch_agencies_and_cfr()
+    parser = argparse.ArgumentParser(description="Fetch agencies.json and every CFR chapter they reference")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="concurrent requests (default: 4)")
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND,
+                        help=f"maximum requests per second across all workers (default: {REQUESTS_PER_SECOND})")
+    parser.add_argument('--title', action='append',
+                        help="only fetch chapters of this title (repeatable; default: all titles)")
+    args = parser.parse_args()
+    fetch_agencies_and_cfr(workers=args.workers, rate=args.rate, titles=args.title)
@@ -1,44 +1,109 @@
 
 
 import os
-import requests
+import argparse
+from fetcher import TokenBucket, make_session, request_with_retries, download_file, run_jobs
+from manifest import CACHE_DIR, file_fingerprint, load_manifest, save_manifest, is_unchanged
 
-def download_all_titles(raw_dir):
-    titles_url = "https://www.ecfr.gov/api/versioner/v1/titles"
-    r = requests.get(titles_url)
+TITLES_URL = "https://www.ecfr.gov/api/versioner/v1/titles"
+XML_URL = "https://www.govinfo.gov/bulkdata/ECFR/title-{0}/ECFR-title{0}.xml"
+# Anything smaller is an error page rather than a title
+MIN_XML_SIZE = 1000
+# ETag, Last-Modified and content fingerprint of each downloaded XML
+FETCH_MANIFEST_PATH = os.path.join(CACHE_DIR, 'fetch_manifest.json')
+
+def conditional_headers(entry, out_path):
+    # Only ask for "changed since" when the local copy is the one the
+    # manifest describes; otherwise fetch unconditionally
+    if not entry or not is_unchanged(out_path, entry):
+        return {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def fetch_title(session, bucket, xml_url, out_path, entry):
+    # An unchanged title (304, or a 200 with identical content) keeps its
+    # file and mtime, so parse_all_titles and the analysis caches skip it
+    return download_file(
+        session, bucket, xml_url, out_path, min_size=MIN_XML_SIZE,
+        headers=conditional_headers(entry, out_path),
+        expected_sha256=entry.get('sha256') if entry else None
+    )
+
+def download_all_titles(raw_dir, workers=4, rate=4.0, force=False, manifest_path=FETCH_MANIFEST_PATH):
+    # Titles download concurrently over one pooled session, at most `rate`
+    # requests per second in total. Titles are fetched conditionally
+    # against the fetch manifest unless `force` is set; titles this run does
+    # not save keep their manifest entries either way.
+    manifest = load_manifest(manifest_path)
+    session = make_session(pool_size=workers)
+    bucket = TokenBucket(rate)
+    r = request_with_retries(session, bucket, TITLES_URL)
     r.raise_for_status()
     titles = r.json().get("titles", [])
-    not_found = []
-    saved = 0
+    jobs = []
     for title in titles:
         title_num = title.get("number")
         if not title_num:
             print(f"No title number in entry: {title}")
             continue
-        xml_url = f"https://www.govinfo.gov/bulkdata/ECFR/title-{title_num}/ECFR-title{title_num}.xml"
+        xml_url = XML_URL.format(title_num)
         out_path = os.path.join(raw_dir, f"ECFR-title{title_num}.xml")
-        print(f"Downloading Title {title_num} XML from {xml_url} ...", end=" ")
-        resp = requests.get(xml_url, allow_redirects=True)
-        print(f"Status code: {resp.status_code}")
-        if resp.ok and resp.content and len(resp.content) > 1000:
-            with open(out_path, "wb") as f:
-                f.write(resp.content)
-            print(f"Saved to {out_path}")
+        entry = None if force else manifest.get(os.path.basename(out_path))
+        jobs.append((session, bucket, xml_url, out_path, entry))
+    print(f"Downloading {len(jobs)} titles with {workers} workers ...")
+    not_found = []
+    failed = []
+    unchanged = []
+    saved = 0
+    for job, result, error in run_jobs(fetch_title, jobs, workers):
+        key = os.path.basename(job[3])
+        title_num = key[len("ECFR-title"):-len(".xml")]
+        if error is not None:
+            print(f"Failed to download Title {title_num}: {error}")
+            failed.append(title_num)
+        elif result['unchanged']:
+            how = "not modified" if result['status'] == 304 else "identical content"
+            print(f"Title {title_num} unchanged ({how})")
+            unchanged.append(title_num)
+            if result['status'] != 304:
+                # Keep the validators current for the next conditional request
+                manifest[key].update(etag=result['etag'], last_modified=result['last_modified'])
+        elif result['saved']:
+            entry = file_fingerprint(result['path'])
+            entry.update(url=result['url'], etag=result['etag'], last_modified=result['last_modified'])
+            manifest[key] = entry
+            resumed = " (resumed)" if result['resumed'] else ""
+            print(f"Saved Title {title_num} ({result['bytes'] / 1e6:.1f} MB){resumed} to {result['path']}")
             saved += 1
         else:
-            print(f"Not found or empty (status {resp.status_code}) for Title {title_num}")
+            print(f"Not found or empty (status {result['status']}) for Title {title_num}")
             not_found.append(title_num)
+    save_manifest(manifest, manifest_path)
     print("\nSummary:")
     print(f"  Titles saved: {saved}")
+    print(f"  Titles unchanged: {len(unchanged)}")
     print(f"  Titles not found: {len(not_found)} -> {not_found}")
+    print(f"  Titles failed: {len(failed)} -> {failed}")
 
 if __name__ == "__main__":
     print("fetch_titles.py script started")
+    parser = argparse.ArgumentParser(description="Download every ECFR-title*.xml")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="concurrent downloads (default: 4)")
+    parser.add_argument('--rate', type=float, default=4.0,
+                        help="maximum requests per second across all workers (default: 4)")
+    parser.add_argument('--force', action='store_true',
+                        help="download every title even if the server reports it unchanged")
+    args = parser.parse_args()
     try:
         raw_dir = os.path.abspath(os.path.join(
             os.path.dirname(__file__), '..', 'data', 'raw'))
         print(f"Raw directory: {raw_dir}")
         os.makedirs(raw_dir, exist_ok=True)
-        download_all_titles(raw_dir)
+        download_all_titles(raw_dir, workers=args.workers, rate=args.rate, force=args.force)
     except Exception as e:
         print(f"Exception occurred: {e}")
\ No newline at end of file
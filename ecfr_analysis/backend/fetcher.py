@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import random
+import threading
+import email.utils
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from manifest import file_sha256
+
+# Shared HTTP machinery for the downloaders: one pooled session, a token
+# bucket limiting the request rate across all worker threads, retries with
+# exponential backoff that honor Retry-After, and chunked downloads to a
+# .part file that resume with an HTTP Range request. Downloads can be
+# conditional (If-None-Match/If-Modified-Since) and leave the existing file
+# untouched when the server reports, or the body turns out to be, unchanged.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 256 * 1024
+
+
+class TokenBucket:
+    # Allows `rate` requests per second on average and bursts of up to
+    # `capacity`; acquire() blocks until a token is available
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size=8):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt, backoff, max_delay=60):
+    # Exponential backoff with full jitter so workers don't retry in lockstep
+    return random.uniform(0, min(max_delay, backoff * 2 ** attempt))
+
+
+def request_with_retries(session, bucket, url, headers=None, stream=False,
+                         retries=5, backoff=1.0, timeout=60):
+    # GET `url`, retrying connection errors and 429/5xx responses. Returns
+    # the final response (which may still be an error status); raises the
+    # last connection error if every attempt failed to connect.
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            response = session.get(url, headers=headers, stream=stream, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt, backoff)
+            print(f"{url}: {e.__class__.__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        delay = retry_after_seconds(response)
+        if delay is None:
+            delay = backoff_delay(attempt, backoff)
+        response.close()
+        print(f"{url}: status {response.status_code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def response_validators(response):
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def _load_part_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_part_meta(meta_path, response):
+    # Validators of the body being written to the .part file; on resume
+    # they go out as If-Range so a changed file restarts cleanly
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(response_validators(response), url=response.url), f)
+
+
+def _remove_part(part_path, meta_path):
+    for path in (part_path, meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def complete_length(response):
+    # Full length of the remote file from a 416's "Content-Range: bytes */N",
+    # or None when the header is missing or malformed
+    value = response.headers.get('Content-Range', '')
+    unit, _, length = value.partition(' ')
+    if unit.strip() != 'bytes' or not length.startswith('*/') or not length[2:].isdigit():
+        return None
+    return int(length[2:])
+
+
+def if_range_value(meta):
+    # If-Range needs a strong ETag; fall back to the Last-Modified date
+    etag = meta.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return meta.get('last_modified')
+
+
+def download_file(session, bucket, url, out_path, min_size=0, retries=5, backoff=1.0,
+                  chunk_size=CHUNK_SIZE, headers=None, expected_sha256=None):
+    # Stream `url` to out_path in chunks via out_path + '.part'. A download
+    # interrupted mid-body resumes from the bytes already on disk (here on
+    # the next attempt, or on a later run) with a Range request.
+    # `headers` are sent on fresh (non-resumed) requests, e.g. conditional
+    # headers; a 304 leaves out_path as it is. So does a body whose sha256
+    # equals `expected_sha256`, keeping the file's mtime for downstream
+    # change checks. Returns {'url', 'path', 'status', 'bytes', 'resumed',
+    # 'saved', 'unchanged', 'sha256', 'etag', 'last_modified'}.
+    part_path = out_path + '.part'
+    meta_path = part_path + '.json'
+    result = {'url': url, 'path': out_path, 'status': None, 'bytes': 0, 'resumed': False,
+              'saved': False, 'unchanged': False, 'sha256': None, 'etag': None, 'last_modified': None}
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request_headers = {}
+        if offset:
+            request_headers['Range'] = f'bytes={offset}-'
+            validator = if_range_value(_load_part_meta(meta_path))
+            if validator:
+                request_headers['If-Range'] = validator
+        elif headers:
+            request_headers.update(headers)
+        response = request_with_retries(session, bucket, url, headers=request_headers, stream=True,
+                                        retries=retries, backoff=backoff)
+        result['status'] = response.status_code
+        if response.status_code == 304:
+            response.close()
+            result['unchanged'] = True
+            return result
+        if response.status_code == 416 and offset:
+            response.close()
+            if (complete_length(response) == offset
+                    and if_range_value(_load_part_meta(meta_path))):
+                # Nothing left to fetch: the .part file already holds the body
+                break
+            # The remote file no longer matches the partial body; start over
+            _remove_part(part_path, meta_path)
+            continue
+        if response.status_code not in (200, 206):
+            response.close()
+            return result
+        resuming = response.status_code == 206
+        result['resumed'] = result['resumed'] or resuming
+        if not resuming:
+            _save_part_meta(meta_path, response)
+        try:
+            with open(part_path, 'ab' if resuming else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+            break
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt, backoff)
+            print(f"{url}: interrupted ({e.__class__.__name__}), resuming in {delay:.1f}s")
+            time.sleep(delay)
+        finally:
+            response.close()
+    meta = _load_part_meta(meta_path)
+    result['etag'] = meta.get('etag')
+    result['last_modified'] = meta.get('last_modified')
+    size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    result['bytes'] = size
+    if size < min_size:
+        _remove_part(part_path, meta_path)
+        return result
+    result['sha256'] = file_sha256(part_path)
+    if expected_sha256 and result['sha256'] == expected_sha256 and os.path.exists(out_path):
+        os.remove(part_path)
+        result['unchanged'] = True
+    else:
+        os.replace(part_path, out_path)
+        result['saved'] = True
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return result
+
+
+def run_jobs(fn, jobs, workers=4):
+    # Run fn(*job) for every job on a thread pool; yields (job, result,
+    # error) as each finishes, with error None on success
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fn, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import sqlite3
+import time
+import numpy as np
+from manifest import file_fingerprint, is_unchanged
+
+# Node-level analytics for the cross-reference graphs, computed once per
+# build and stored in SQLite so the API and dashboard can rank sections
+# without doing graph math per request: in/out degree, PageRank, weakly
+# connected components and label-propagation communities.
+#
+# Edges are held as source/target index arrays (a COO sparse matrix);
+# PageRank's matrix-vector products are np.bincount over those arrays, and
+# components and communities are array passes over the same edges.
+
+ANALYTICS_DB = 'graph_analytics.sqlite'
+# Bump when a measure changes so every graph is recomputed
+ANALYTICS_VERSION = 2
+# Graphs analysed, by the name the API uses for them
+GRAPH_FILES = {
+    'title': 'cross_reference_graph.json',
+    'global': 'cross_reference_graph_global.json'
+}
+SORT_COLUMNS = ('pagerank', 'in_degree', 'out_degree')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS node_analytics (
+    id INTEGER PRIMARY KEY,
+    graph TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    node TEXT NOT NULL,
+    type TEXT,
+    part TEXT,
+    in_degree INTEGER,
+    out_degree INTEGER,
+    pagerank REAL,
+    component INTEGER,
+    community INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_na_graph_pagerank
+    ON node_analytics (graph, pagerank);
+CREATE INDEX IF NOT EXISTS idx_na_graph_type_pagerank
+    ON node_analytics (graph, type, pagerank);
+CREATE INDEX IF NOT EXISTS idx_na_graph_in_degree
+    ON node_analytics (graph, in_degree);
+CREATE INDEX IF NOT EXISTS idx_na_graph_component
+    ON node_analytics (graph, component);
+CREATE INDEX IF NOT EXISTS idx_na_graph_community
+    ON node_analytics (graph, community);
+CREATE TABLE IF NOT EXISTS analytics_graphs (
+    graph TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+'''
+
+def open_analytics_store(processed_dir):
+    conn = sqlite3.connect(os.path.join(processed_dir, ANALYTICS_DB))
+    conn.executescript(SCHEMA)
+    return conn
+
+def edge_arrays(graph):
+    # (source, target) node positions of every edge between known nodes;
+    # references to unresolved targets are not part of the analytics
+    position = {}
+    for i, node in enumerate(graph.get('nodes', [])):
+        position.setdefault(node['id'], i)
+    sources = []
+    targets = []
+    for edge in graph.get('edges', []):
+        source = position.get(edge['source'])
+        target = position.get(edge['target'])
+        if source is not None and target is not None:
+            sources.append(source)
+            targets.append(target)
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+def pagerank(n, sources, targets, damping=0.85, tol=1e-10, max_iter=100):
+    # Power iteration over the edge arrays. Repeated edges count as
+    # weight, self-references are ignored and the rank of nodes without
+    # outgoing edges is spread evenly.
+    keep = sources != targets
+    sources = sources[keep]
+    targets = targets[keep]
+    out_degree = np.bincount(sources, minlength=n).astype(float)
+    dangling = out_degree == 0
+    share = np.zeros(n)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        share[~dangling] = rank[~dangling] / out_degree[~dangling]
+        spread = np.bincount(targets, weights=share[sources], minlength=n)
+        new_rank = damping * (spread + rank[dangling].sum() / n) + (1 - damping) / n
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < tol:
+            break
+    return rank
+
+def renumber_by_size(labels):
+    # Relabel groups 0, 1, 2, ... from largest to smallest (ties by first
+    # node), so component 0 is always the giant component
+    _, first, inverse, counts = np.unique(labels, return_index=True, return_inverse=True, return_counts=True)
+    order = np.lexsort((first, -counts))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[inverse.reshape(-1)]
+
+def weak_components(n, sources, targets):
+    # Minimum-label propagation with pointer jumping: every node ends up
+    # labelled with the smallest node position in its component
+    labels = np.arange(n)
+    while True:
+        before = labels.copy()
+        np.minimum.at(labels, sources, labels[targets])
+        np.minimum.at(labels, targets, labels[sources])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, before):
+            return renumber_by_size(labels)
+
+def communities(n, sources, targets, max_sweeps=20):
+    # Label propagation on the undirected graph, vectorised over the edge
+    # arrays: each node adopts the label carried by the most edges to its
+    # neighbours (keeping its own label on a tie, otherwise the smallest).
+    # Nodes at even and odd positions update in alternate half-steps so
+    # neighbours rarely swap labels back and forth. Communities never span
+    # components.
+    keep = sources != targets
+    ends = np.concatenate((sources[keep], targets[keep]))
+    others = np.concatenate((targets[keep], sources[keep]))
+    labels = np.arange(n)
+    halves = [ends % 2 == 0, ends % 2 == 1]
+    for _ in range(max_sweeps):
+        changed = False
+        for half in halves:
+            if not half.any():
+                continue
+            # Edge weight per (node, neighbour label) pair
+            pairs, weight = np.unique(ends[half] * n + labels[others[half]], return_counts=True)
+            node = pairs // n
+            label = pairs % n
+            current = label == labels[node]
+            order = np.lexsort((label, ~current, -weight, node))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = node[order][1:] != node[order][:-1]
+            best_node = node[order][first]
+            best_label = label[order][first]
+            moved = labels[best_node] != best_label
+            if moved.any():
+                labels[best_node[moved]] = best_label[moved]
+                changed = True
+        if not changed:
+            break
+    return renumber_by_size(labels)
+
+def compute_graph_analytics(graph):
+    # One row per node, in node order, plus a summary of the graph
+    nodes = graph.get('nodes', [])
+    n = len(nodes)
+    sources, targets = edge_arrays(graph)
+    in_degree = np.bincount(targets, minlength=n)
+    out_degree = np.bincount(sources, minlength=n)
+    rank = pagerank(n, sources, targets) if n else np.zeros(0)
+    component = weak_components(n, sources, targets) if n else np.zeros(0, dtype=np.int64)
+    community = communities(n, sources, targets) if n else np.zeros(0, dtype=np.int64)
+    rows = [
+        {
+            'node': node['id'],
+            'type': node.get('type'),
+            'part': node.get('part'),
+            'in_degree': int(in_degree[i]),
+            'out_degree': int(out_degree[i]),
+            'pagerank': float(rank[i]),
+            'component': int(component[i]),
+            'community': int(community[i])
+        }
+        for i, node in enumerate(nodes)
+    ]
+    summary = {
+        'nodes': n,
+        'edges': len(graph.get('edges', [])),
+        'resolved_edges': int(len(sources)),
+        'components': int(component.max()) + 1 if n else 0,
+        'largest_component': int(np.bincount(component).max()) if n else 0,
+        'communities': int(community.max()) + 1 if n else 0,
+        'largest_community': int(np.bincount(community).max()) if n else 0
+    }
+    return rows, summary
+
+def store_graph(conn, name, path):
+    with open(path, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    rows, summary = compute_graph_analytics(graph)
+    entry = file_fingerprint(path)
+    entry['analytics_version'] = ANALYTICS_VERSION
+    with conn:
+        conn.execute('DELETE FROM node_analytics WHERE graph = ?', (name,))
+        conn.executemany(
+            'INSERT INTO node_analytics (graph, position, node, type, part, in_degree, out_degree, '
+            'pagerank, component, community) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (name, i, row['node'], row['type'], row['part'], row['in_degree'], row['out_degree'],
+                 row['pagerank'], row['component'], row['community'])
+                for i, row in enumerate(rows)
+            ]
+        )
+        conn.execute(
+            'INSERT OR REPLACE INTO analytics_graphs VALUES (?, ?, ?, ?)',
+            (name, os.path.basename(path), json.dumps(entry), json.dumps(summary))
+        )
+    return summary
+
+def update_graph_analytics(processed_dir, force=False):
+    # Recompute only graphs whose file changed and drop graphs whose file is
+    # gone. Returns the names of the updated graphs.
+    conn = open_analytics_store(processed_dir)
+    try:
+        stored = {
+            name: json.loads(fingerprint)
+            for name, fingerprint in conn.execute('SELECT graph, fingerprint FROM analytics_graphs')
+        }
+        changed = []
+        for name, filename in GRAPH_FILES.items():
+            path = os.path.join(processed_dir, filename)
+            if not os.path.exists(path):
+                if name in stored:
+                    with conn:
+                        conn.execute('DELETE FROM node_analytics WHERE graph = ?', (name,))
+                        conn.execute('DELETE FROM analytics_graphs WHERE graph = ?', (name,))
+                    print(f"Removed {name} graph from the analytics store")
+                continue
+            entry = stored.get(name)
+            if (not force and entry and entry.get('analytics_version') == ANALYTICS_VERSION
+                    and is_unchanged(path, entry)):
+                continue
+            start = time.perf_counter()
+            summary = store_graph(conn, name, path)
+            changed.append(name)
+            print(f"Graph analytics for {filename}: {summary['nodes']} nodes, "
+                  f"{summary['components']} components, {summary['communities']} communities "
+                  f"in {time.perf_counter() - start:.1f}s")
+        return changed
+    finally:
+        conn.close()
+
+def query_central_nodes(conn, graph='title', node_type=None, component=None, community=None,
+                        sort='pagerank', ascending=False, page=1, per_page=20):
+    # One page of nodes ranked by PageRank (or degree) plus the number of
+    # matches; most central first unless ascending
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column {sort!r}; expected one of {SORT_COLUMNS}")
+    clauses = ['graph = ?']
+    params = [graph]
+    if node_type:
+        clauses.append('type = ?')
+        params.append(node_type)
+    if component is not None:
+        clauses.append('component = ?')
+        params.append(component)
+    if community is not None:
+        clauses.append('community = ?')
+        params.append(community)
+    where = ' AND '.join(clauses)
+    total = conn.execute(f'SELECT COUNT(*) FROM node_analytics WHERE {where}', params).fetchone()[0]
+    direction = 'ASC' if ascending else 'DESC'
+    cursor = conn.execute(
+        'SELECT node, type, part, in_degree, out_degree, pagerank, component, community '
+        f'FROM node_analytics WHERE {where} ORDER BY {sort} {direction}, position LIMIT ? OFFSET ?',
+        params + [per_page, (page - 1) * per_page]
+    )
+    columns = ('node', 'type', 'part', 'in_degree', 'out_degree', 'pagerank', 'component', 'community')
+    rows = [dict(zip(columns, row)) for row in cursor]
+    return {'total': total, 'page': page, 'per_page': per_page, 'rows': rows}
+
+def graph_summary(conn, graph='title'):
+    # Totals for one graph, or None when it has not been analysed
+    row = conn.execute('SELECT summary FROM analytics_graphs WHERE graph = ?', (graph,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+if __name__ == "__main__":
+    # Build or incrementally update the store:
+    #   python graph_analytics.py [--force]
+    update_graph_analytics(
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'processed')),
+        force='--force' in sys.argv[1:]
+    )
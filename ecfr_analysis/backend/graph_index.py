@@ -0,0 +1,134 @@
+from collections import defaultdict, deque
+
+# Lookup structures over a cross-reference graph ({'nodes': [...], 'edges':
+# [...]}), built once when the graph is loaded so queries touch only the
+# nodes and edges they return. Nodes and edges are referred to by their
+# position in the graph's lists, which keeps results in file order.
+
+def build_graph_index(graph):
+    nodes = graph.get('nodes', [])
+    edges = graph.get('edges', [])
+    position = {}
+    by_part = defaultdict(set)
+    by_section = defaultdict(set)
+    for i, node in enumerate(nodes):
+        node_id = node['id']
+        position.setdefault(node_id, i)
+        if node.get('part'):
+            by_part[node['part']].add(i)
+        if node.get('section'):
+            by_section[node['section']].add(i)
+        if node.get('type') == 'part':
+            by_part[node_id].add(i)
+        elif node.get('type') == 'section':
+            by_section[node_id].add(i)
+    out_edges = defaultdict(list)
+    in_edges = defaultdict(list)
+    degree = [0] * len(nodes)
+    # Only edges between known nodes take part in filtering and traversal;
+    # unresolved targets stay in the full graph file
+    for j, edge in enumerate(edges):
+        source = position.get(edge['source'])
+        target = position.get(edge['target'])
+        if source is not None:
+            degree[source] += 1
+        if target is not None:
+            degree[target] += 1
+        if source is not None and target is not None:
+            out_edges[source].append((j, target))
+            in_edges[target].append((j, source))
+    return {
+        'graph': graph,
+        'position': position,
+        'by_part': by_part,
+        'by_section': by_section,
+        'out_edges': out_edges,
+        'in_edges': in_edges,
+        'degree': degree
+    }
+
+def members(lookup, keys):
+    result = set()
+    for key in keys:
+        result |= lookup.get(key, set())
+    return result
+
+def neighborhood(index, node_id, hops):
+    # Nodes within `hops` edges of node_id, following references in either
+    # direction
+    start = index['position'].get(node_id)
+    if start is None:
+        return set()
+    seen = {start}
+    frontier = deque([(start, 0)])
+    while frontier:
+        node, depth = frontier.popleft()
+        if depth == hops:
+            continue
+        for _, other in index['out_edges'].get(node, []) + index['in_edges'].get(node, []):
+            if other not in seen:
+                seen.add(other)
+                frontier.append((other, depth + 1))
+    return seen
+
+def select_nodes(index, parts=None, sections=None, node_id=None, hops=1, min_degree=0):
+    # Positions of the nodes matching every given filter, or None when no
+    # filter is given (the whole graph)
+    selected = None
+    if parts:
+        selected = members(index['by_part'], parts)
+    if sections:
+        matches = members(index['by_section'], sections)
+        selected = matches if selected is None else selected & matches
+    if node_id is not None:
+        matches = neighborhood(index, node_id, hops)
+        selected = matches if selected is None else selected & matches
+    if min_degree:
+        if selected is None:
+            selected = range(len(index['degree']))
+        selected = {i for i in selected if index['degree'][i] >= min_degree}
+    return selected
+
+def subgraph_edges(index, selected):
+    # Positions, in file order, of the edges with both ends selected
+    return sorted(
+        j
+        for source in selected
+        for j, target in index['out_edges'].get(source, [])
+        if target in selected
+    )
+
+def query_graph(index, selected, limit=None, cursor=0):
+    # Without a limit: the whole induced subgraph, {'nodes', 'edges'}.
+    # With a limit: one page of its edges starting at `cursor`, the nodes
+    # those edges touch, the totals and the cursor of the next page (None
+    # on the last page). selected=None is the whole graph, paged over every
+    # edge in the file, including references to unresolved targets (which
+    # have no node of their own).
+    nodes = index['graph']['nodes']
+    edges = index['graph']['edges']
+    if selected is None:
+        selected = range(len(nodes))
+        edge_ids = range(len(edges))
+    else:
+        edge_ids = subgraph_edges(index, selected)
+    if limit is None:
+        return {
+            'nodes': [nodes[i] for i in sorted(selected)],
+            'edges': [edges[j] for j in edge_ids]
+        }
+    page = edge_ids[cursor:cursor + limit]
+    page_nodes = set()
+    for j in page:
+        for end in (edges[j]['source'], edges[j]['target']):
+            position = index['position'].get(end)
+            if position is not None:
+                page_nodes.add(position)
+    next_cursor = cursor + limit if cursor + limit < len(edge_ids) else None
+    return {
+        'nodes': [nodes[i] for i in sorted(page_nodes)],
+        'edges': [edges[j] for j in page],
+        'total_nodes': len(selected),
+        'total_edges': len(edge_ids),
+        'next_cursor': next_cursor
+    }
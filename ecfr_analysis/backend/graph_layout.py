@@ -0,0 +1,211 @@
+import os
+import json
+import hashlib
+import numpy as np
+from graph_index import build_graph_index
+
+# Precomputed node positions for drawing a cross-reference graph, and
+# reduced views of large graphs for the dashboard's canvas renderer.
+#
+# The layout is deterministic and linear in the graph size: parts (and
+# other top-level nodes) are spread over a sunflower spiral, each part's
+# sections are packed around it the same way, and a few smoothing passes
+# pull referenced nodes toward each other while staying anchored to that
+# base placement. Positions are normalised to the unit square.
+
+LAYOUT_VERSION = 1
+GOLDEN_ANGLE = np.pi * (3 - np.sqrt(5))
+
+
+def layout_path(graph_path):
+    # cross_reference_graph.json -> cross_reference_graph_layout.json
+    return graph_path[:-len('.json')] + '_layout.json'
+
+
+def graph_signature(graph):
+    # Identifies the node order and edge set the positions belong to,
+    # independently of how the graph file is formatted
+    h = hashlib.sha1()
+    for node in graph.get('nodes', []):
+        h.update(node['id'].encode('utf-8') + b'\0')
+    h.update(b'\1')
+    for edge in graph.get('edges', []):
+        h.update(edge['source'].encode('utf-8') + b'\0' + edge['target'].encode('utf-8') + b'\0')
+    return h.hexdigest()
+
+
+def sunflower(n):
+    # n points spread evenly over a disc of radius ~sqrt(n)
+    i = np.arange(n)
+    radius = np.sqrt(i + 0.5)
+    theta = i * GOLDEN_ANGLE
+    return np.column_stack((radius * np.cos(theta), radius * np.sin(theta)))
+
+
+def node_groups(nodes):
+    # Group key per node: a section belongs to its part, everything else
+    # is its own group
+    return [node.get('part') or node['id'] for node in nodes]
+
+
+def compute_layout(graph, iterations=20, pull=0.5):
+    nodes = graph.get('nodes', [])
+    n = len(nodes)
+    signature = graph_signature(graph)
+    if not n:
+        return {'version': LAYOUT_VERSION, 'signature': signature, 'positions': []}
+    keys = node_groups(nodes)
+    group_ids = {}
+    group_of = np.array([group_ids.setdefault(key, len(group_ids)) for key in keys])
+    sizes = np.bincount(group_of)
+    # Base placement: group centres on a spiral spaced by the largest
+    # group's radius, members on a small spiral around their centre
+    member_rank = np.zeros(n, dtype=np.int64)
+    seen = np.zeros(len(sizes), dtype=np.int64)
+    for i, g in enumerate(group_of):
+        member_rank[i] = seen[g]
+        seen[g] += 1
+    spacing = 2 * np.sqrt(sizes.max())
+    centres = sunflower(len(sizes)) * spacing
+    offsets = sunflower(int(sizes.max()))
+    base = centres[group_of] + offsets[member_rank]
+
+    # Smoothing: pos = (1 - pull) * base + pull * mean(neighbour positions),
+    # with neighbours taken in both directions
+    index = build_graph_index(graph)
+    sources = []
+    targets = []
+    for source, out in index['out_edges'].items():
+        for _, target in out:
+            if source != target:
+                sources.append(source)
+                targets.append(target)
+    positions = base.copy()
+    if sources:
+        ends = np.array(sources + targets)
+        others = np.array(targets + sources)
+        counts = np.bincount(ends, minlength=n)
+        linked = counts > 0
+        for _ in range(iterations):
+            sums = np.zeros((n, 2))
+            np.add.at(sums, ends, positions[others])
+            smoothed = base.copy()
+            smoothed[linked] = (1 - pull) * base[linked] + pull * sums[linked] / counts[linked, None]
+            positions = smoothed
+
+    low = positions.min(axis=0)
+    extent = max(float((positions.max(axis=0) - low).max()), 1e-9)
+    positions = (positions - low) / extent
+    return {
+        'version': LAYOUT_VERSION,
+        'signature': signature,
+        'positions': np.round(positions, 5).tolist()
+    }
+
+
+def load_or_compute_layout(graph_path, graph):
+    # Reuse the stored layout while it matches the graph; otherwise
+    # recompute it and store it next to the graph
+    path = layout_path(graph_path)
+    signature = graph_signature(graph)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+            if layout.get('version') == LAYOUT_VERSION and layout.get('signature') == signature:
+                return layout
+        except (OSError, ValueError):
+            pass
+    layout = compute_layout(graph)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(layout, f)
+    os.replace(tmp_path, path)
+    return layout
+
+
+def weighted_edges(pairs):
+    # [[source, target, count]] for the distinct (source, target) pairs
+    counts = {}
+    for pair in pairs:
+        counts[pair] = counts.get(pair, 0) + 1
+    return [[source, target, weight] for (source, target), weight in counts.items()]
+
+
+def layout_view(graph, index, layout, reduce=None, max_nodes=None, selected=None):
+    # Compact drawing data: nodes with positions, and edges as
+    # [source node index, target node index, weight] over the returned
+    # nodes. `selected` (node positions, e.g. from select_nodes) limits the
+    # view to a subgraph. reduce='degree' keeps the max_nodes
+    # best-connected nodes; reduce='part' merges every section into its part.
+    nodes = graph.get('nodes', [])
+    positions = layout['positions']
+    degree = index['degree']
+    candidates = range(len(nodes)) if selected is None else sorted(selected)
+    chosen = None if selected is None else set(candidates)
+    pairs = [
+        (source, target)
+        for source, out in index['out_edges'].items()
+        if chosen is None or source in chosen
+        for _, target in out
+        if chosen is None or target in chosen
+    ]
+    total = {'total_nodes': len(candidates), 'total_edges': len(pairs)}
+    if reduce == 'part':
+        keys = node_groups(nodes)
+        group_ids = {}
+        members = []
+        for i in candidates:
+            g = group_ids.setdefault(keys[i], len(group_ids))
+            if g == len(members):
+                members.append([])
+            members[g].append(i)
+        view_nodes = []
+        for key, g in group_ids.items():
+            xy = np.mean([positions[i] for i in members[g]], axis=0)
+            # A group holding sections is a part even if the part node
+            # itself is missing
+            is_part = any(nodes[i].get('type') == 'part' or nodes[i].get('part') for i in members[g])
+            view_nodes.append({
+                'id': key,
+                'type': 'part' if is_part else nodes[members[g][0]].get('type', ''),
+                'x': round(float(xy[0]), 5),
+                'y': round(float(xy[1]), 5),
+                'size': len(members[g]),
+                'degree': sum(degree[i] for i in members[g])
+            })
+        group_of = {i: group_ids[keys[i]] for i in candidates}
+        edges = weighted_edges(
+            (group_of[s], group_of[t]) for s, t in pairs if group_of[s] != group_of[t]
+        )
+        return dict(total, reduced='part', nodes=view_nodes, edges=edges)
+
+    keep = candidates
+    if reduce == 'degree' and max_nodes and max_nodes < len(candidates):
+        keep = sorted(sorted(candidates, key=lambda i: -degree[i])[:max_nodes])
+    view_index = {i: k for k, i in enumerate(keep)}
+    view_nodes = [
+        {
+            'id': nodes[i]['id'],
+            'type': nodes[i].get('type', ''),
+            'x': positions[i][0],
+            'y': positions[i][1],
+            'size': 1,
+            'degree': degree[i]
+        }
+        for i in keep
+    ]
+    edges = weighted_edges(
+        (view_index[s], view_index[t]) for s, t in pairs if s in view_index and t in view_index
+    )
+    return dict(total, reduced=reduce if len(view_nodes) < len(candidates) else None, nodes=view_nodes, edges=edges)
+
+
+if __name__ == "__main__":
+    # Precompute layouts: python graph_layout.py path/to/cross_reference_graph.json ...
+    import sys
+    for graph_path in sys.argv[1:]:
+        with open(graph_path, 'r', encoding='utf-8') as f:
+            graph = json.load(f)
+        load_or_compute_layout(graph_path, graph)
+        print(f"Wrote {layout_path(graph_path)} ({len(graph.get('nodes', []))} nodes)")
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import sqlite3
+
+HISTORY_DB = 'metrics_history.sqlite'
+LEGACY_HISTORY_JSON = 'metrics_history.json'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS metrics_history (
+    timestamp TEXT NOT NULL,
+    file TEXT NOT NULL,
+    word_count INTEGER,
+    checksum TEXT,
+    readability REAL,
+    PRIMARY KEY (timestamp, file)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_history_file_ts
+    ON metrics_history (file, timestamp);
+'''
+
+def open_history(processed_dir):
+    # Open (creating if needed) the append-only history store. A fresh store
+    # is seeded from the legacy metrics_history.json when one exists.
+    db_path = os.path.join(processed_dir, HISTORY_DB)
+    is_new = not os.path.exists(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    legacy_path = os.path.join(processed_dir, LEGACY_HISTORY_JSON)
+    if is_new and os.path.exists(legacy_path):
+        migrate_json_history(conn, legacy_path)
+    return conn
+
+def append_metrics(conn, metrics, timestamp):
+    rows = [
+        (timestamp, fname, m.get('word_count'), m.get('checksum'), m.get('readability'))
+        for fname, m in metrics.items()
+    ]
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO metrics_history VALUES (?, ?, ?, ?, ?)', rows
+        )
+
+def migrate_json_history(conn, json_path):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        history = json.load(f)
+    rows = [
+        (entry['timestamp'], fname, m.get('word_count'), m.get('checksum'), m.get('readability'))
+        for entry in history
+        for fname, m in entry.get('metrics', {}).items()
+    ]
+    # INSERT OR IGNORE keeps the migration idempotent
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO metrics_history VALUES (?, ?, ?, ?, ?)', rows
+        )
+    print(f"Migrated {len(history)} history entries ({len(rows)} rows) from {json_path}")
+    return len(rows)
+
+def list_history_files(conn):
+    return [row[0] for row in conn.execute(
+        'SELECT DISTINCT file FROM metrics_history ORDER BY file'
+    )]
+
+def query_history_rows(conn, start=None, end=None, files=None):
+    # Flat (timestamp, file, word_count, checksum, readability) records,
+    # optionally restricted to a timestamp range and/or a set of files
+    clauses = []
+    params = []
+    if start:
+        clauses.append('timestamp >= ?')
+        params.append(start)
+    if end:
+        clauses.append('timestamp <= ?')
+        params.append(end)
+    if files:
+        clauses.append(f"file IN ({', '.join('?' for _ in files)})")
+        params.extend(files)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = conn.execute(
+        'SELECT timestamp, file, word_count, checksum, readability '
+        f'FROM metrics_history {where} ORDER BY timestamp, file', params
+    )
+    return [
+        {
+            'timestamp': ts,
+            'file': fname,
+            'word_count': wc,
+            'checksum': checksum,
+            'readability': readability
+        }
+        for ts, fname, wc, checksum, readability in cursor
+    ]
+
+def query_history(conn, start=None, end=None, files=None):
+    # Same shape as the legacy metrics_history.json:
+    # [{'timestamp': ..., 'metrics': {file: {...}}}, ...]
+    history = []
+    for row in query_history_rows(conn, start, end, files):
+        if not history or history[-1]['timestamp'] != row['timestamp']:
+            history.append({'timestamp': row['timestamp'], 'metrics': {}})
+        history[-1]['metrics'][row['file']] = {
+            'word_count': row['word_count'],
+            'checksum': row['checksum'],
+            'readability': row['readability']
+        }
+    return history
+
+if __name__ == "__main__":
+    # Migrate metrics_history.json into the store:
+    #   python history_store.py [path/to/processed_dir]
+    processed_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.abspath(
+        os.path.join(os.path.dirname(__file__), '..', 'data', 'processed'))
+    existed = os.path.exists(os.path.join(processed_dir, HISTORY_DB))
+    conn = open_history(processed_dir)
+    legacy_path = os.path.join(processed_dir, LEGACY_HISTORY_JSON)
+    if existed and os.path.exists(legacy_path):
+        migrate_json_history(conn, legacy_path)
+    count = conn.execute('SELECT COUNT(*) FROM metrics_history').fetchone()[0]
+    print(f"History store has {count} rows")
+    conn.close()
@@ -0,0 +1,53 @@
+import os
+import json
+import hashlib
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache'))
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    # Hash in chunks so multi-hundred-MB XML files never sit in memory
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_fingerprint(path):
+    st = os.stat(path)
+    return {
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'sha256': file_sha256(path)
+    }
+
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+    return {}
+
+def save_manifest(manifest, manifest_path):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def is_unchanged(path, entry):
+    # Cheap size/mtime check first; only hash when the stat has changed
+    # (e.g. the file was re-downloaded with identical content).
+    # Updates entry['mtime'] in place when the content turns out identical.
+    if not entry or not os.path.exists(path):
+        return False
+    st = os.stat(path)
+    if st.st_size != entry.get('size'):
+        return False
+    if st.st_mtime == entry.get('mtime'):
+        return True
+    if file_sha256(path) == entry.get('sha256'):
+        entry['mtime'] = st.st_mtime
+        return True
+    return False
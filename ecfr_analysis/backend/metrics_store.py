@@ -0,0 +1,154 @@
+import os
+import sys
+import sqlite3
+from analysis import DATA_DIR, rollup_metrics
+from parsed_store import load_parsed
+from title_store import title_id_range, title_fingerprint, record_title, update_title_store
+from columnar_export import PART_SECTION_METRICS, export_is_current, load_part_section_metrics
+
+METRICS_DB = 'part_section_metrics.sqlite'
+# Bump when the row definitions change so every title is recomputed
+METRICS_STORE_VERSION = 1
+SORT_COLUMNS = ('position', 'word_count', 'readability')
+
+# Part and section metrics for every title, one row per part or section.
+# Row ids come from title_store.title_id_range, so rows keep document order
+# and a title is replaced with one id range delete.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS part_section_metrics (
+    id INTEGER PRIMARY KEY,
+    title INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    part_heading TEXT,
+    section_heading TEXT,
+    word_count INTEGER,
+    readability REAL
+);
+CREATE INDEX IF NOT EXISTS idx_psm_level_readability
+    ON part_section_metrics (level, readability);
+CREATE INDEX IF NOT EXISTS idx_psm_level_word_count
+    ON part_section_metrics (level, word_count);
+CREATE INDEX IF NOT EXISTS idx_psm_title_part
+    ON part_section_metrics (title, part_heading);
+CREATE TABLE IF NOT EXISTS metrics_titles (
+    title INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+'''
+
+def open_metrics_store(processed_dir):
+    conn = sqlite3.connect(os.path.join(processed_dir, METRICS_DB))
+    conn.executescript(SCHEMA)
+    return conn
+
+def title_rows(title_num, path):
+    # Read the precomputed rows from the columnar export when it is current
+    # (one small Parquet file); otherwise tokenize the parsed title
+    if export_is_current(PART_SECTION_METRICS, title_num, path):
+        return load_part_section_metrics(
+            ['level', 'part_heading', 'section_heading', 'word_count', 'readability'], titles=[title_num]
+        ).to_pylist()
+    return rollup_metrics(load_parsed(path))['rows']
+
+def store_title(conn, title_num, path):
+    rows = title_rows(title_num, path)
+    first, _ = title_id_range(title_num)
+    entry = title_fingerprint(path, 'store_version', METRICS_STORE_VERSION)
+    with conn:
+        conn.execute('DELETE FROM part_section_metrics WHERE id BETWEEN ? AND ?', title_id_range(title_num))
+        conn.executemany(
+            'INSERT INTO part_section_metrics VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (first + i, int(title_num), row['level'], row['part_heading'], row['section_heading'],
+                 row['word_count'], row['readability'])
+                for i, row in enumerate(rows)
+            ]
+        )
+        record_title(conn, 'metrics_titles', title_num, path, entry)
+
+def remove_title(conn, title_num):
+    with conn:
+        conn.execute('DELETE FROM part_section_metrics WHERE id BETWEEN ? AND ?', title_id_range(title_num))
+        conn.execute('DELETE FROM metrics_titles WHERE title = ?', (int(title_num),))
+
+def update_metrics_store(raw_dir, processed_dir, force=False):
+    # Recompute only titles whose parsed file changed and drop titles that
+    # no longer exist. Returns the list of updated title numbers.
+    conn = open_metrics_store(processed_dir)
+    try:
+        return update_title_store(
+            conn, 'metrics_titles', raw_dir, 'store_version', METRICS_STORE_VERSION,
+            store_title, remove_title, 'metrics store', force
+        )
+    finally:
+        conn.close()
+
+def where_clause(titles=None, level=None, parts=None, min_readability=None, max_readability=None):
+    clauses = []
+    params = []
+    if titles:
+        clauses.append(f"title IN ({', '.join('?' for _ in titles)})")
+        params.extend(int(t) for t in titles)
+    if level:
+        clauses.append('level = ?')
+        params.append(level)
+    if parts:
+        clauses.append(f"part_heading IN ({', '.join('?' for _ in parts)})")
+        params.extend(parts)
+    if min_readability is not None:
+        clauses.append('readability >= ?')
+        params.append(min_readability)
+    if max_readability is not None:
+        clauses.append('readability <= ?')
+        params.append(max_readability)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ''), params
+
+def query_metrics(conn, titles=None, level=None, parts=None, min_readability=None, max_readability=None,
+                  sort='position', ascending=True, page=1, per_page=20):
+    # One page of matching rows plus the total number of matches. Rows
+    # are in document order unless sorted by word_count or readability.
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column {sort!r}; expected one of {SORT_COLUMNS}")
+    where, params = where_clause(titles, level, parts, min_readability, max_readability)
+    total = conn.execute(f'SELECT COUNT(*) FROM part_section_metrics {where}', params).fetchone()[0]
+    order = 'id' if sort == 'position' else sort
+    direction = 'ASC' if ascending else 'DESC'
+    cursor = conn.execute(
+        'SELECT title, level, part_heading, section_heading, word_count, readability '
+        f'FROM part_section_metrics {where} ORDER BY {order} {direction}, id LIMIT ? OFFSET ?',
+        params + [per_page, (page - 1) * per_page]
+    )
+    rows = [
+        {
+            'title': title,
+            'level': row_level,
+            'part_heading': part_heading,
+            'section_heading': section_heading,
+            'word_count': word_count,
+            'readability': readability
+        }
+        for title, row_level, part_heading, section_heading, word_count, readability in cursor
+    ]
+    return {'total': total, 'page': page, 'per_page': per_page, 'rows': rows}
+
+def metrics_facets(conn, titles=None, level=None):
+    # Choices for the filter widgets: levels, part headings and the
+    # readability range of the selected titles (and level)
+    where, params = where_clause(titles, level)
+    levels = [row[0] for row in conn.execute(
+        f'SELECT DISTINCT level FROM part_section_metrics {where} ORDER BY level', params)]
+    parts = [row[0] for row in conn.execute(
+        f'SELECT part_heading FROM part_section_metrics {where} GROUP BY part_heading ORDER BY MIN(id)', params)]
+    low, high = conn.execute(
+        f'SELECT MIN(readability), MAX(readability) FROM part_section_metrics {where}', params).fetchone()
+    return {'levels': levels, 'parts': parts, 'readability': [low, high]}
+
+if __name__ == "__main__":
+    # Build or incrementally update the store:
+    #   python metrics_store.py [--force]
+    update_metrics_store(
+        os.path.join(DATA_DIR, 'raw'),
+        os.path.join(DATA_DIR, 'processed'),
+        force='--force' in sys.argv[1:]
+    )
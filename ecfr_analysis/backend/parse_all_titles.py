@@ -1,22 +1,113 @@
 import os
 import glob
-from parse_title1_xml import parse_title1_xml
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from parse_title1_xml import parse_title1_xml, PARSER_VERSION
+from parsed_store import FORMATS, parsed_json_path
+from manifest import CACHE_DIR, file_fingerprint, load_manifest, save_manifest, is_unchanged
 
 RAW_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'raw'))
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'parse_manifest.json')
 
-def parse_all_titles(raw_dir):
+def title_json_path(raw_dir, xml_path, fmt='json'):
+    title_num = os.path.splitext(os.path.basename(xml_path))[0].replace('ECFR-title', '')
+    return title_num, parsed_json_path(raw_dir, title_num, fmt)
+
+def parse_one_title(xml_path, json_path, streaming=False):
+    # Worker entry point; returns the elapsed seconds and the manifest entry
+    # for the source XML (hashed here so hashing runs in parallel too).
+    # The XML is hashed before it is parsed: if it changes meanwhile, the
+    # entry describes the older content and the next run parses it again.
+    start = time.perf_counter()
+    entry = file_fingerprint(xml_path)
+    parse_title1_xml(xml_path, json_path, streaming=streaming)
+    entry['parser_version'] = PARSER_VERSION
+    entry['output'] = os.path.basename(json_path)
+    return time.perf_counter() - start, entry
+
+def needs_parse(xml_path, json_path, entry):
+    if not entry or entry.get('parser_version') != PARSER_VERSION:
+        return True
+    if not os.path.exists(json_path):
+        return True
+    return not is_unchanged(xml_path, entry)
+
+def parse_all_titles(raw_dir, workers=1, streaming=False, force=False, manifest_path=MANIFEST_PATH, fmt='json'):
     xml_files = glob.glob(os.path.join(raw_dir, 'ECFR-title*.xml'))
+    # Largest titles first so a big title doesn't end up as the straggler
+    xml_files.sort(key=os.path.getsize, reverse=True)
     print(f"Found {len(xml_files)} XML files to parse.")
+    manifest = load_manifest(manifest_path)
+    jobs = []
+    skipped = []
     for xml_path in xml_files:
-        title_num = os.path.splitext(os.path.basename(xml_path))[0].replace('ECFR-title', '')
-        json_path = os.path.join(raw_dir, f'title{title_num}_parsed.json')
-        print(f"Parsing Title {title_num}: {xml_path} -> {json_path}")
-        try:
-            parse_title1_xml(xml_path, json_path)
-            print(f"Parsed and saved: {json_path}")
-        except Exception as e:
-            print(f"Failed to parse {xml_path}: {e}")
+        title_num, json_path = title_json_path(raw_dir, xml_path, fmt)
+        key = os.path.basename(xml_path)
+        if not force and not needs_parse(xml_path, json_path, manifest.get(key)):
+            skipped.append(title_num)
+            continue
+        jobs.append((title_num, xml_path, json_path))
+    if skipped:
+        print(f"Skipping {len(skipped)} unchanged titles: {skipped}")
+
+    start = time.perf_counter()
+    parsed = []
+    failed = []
+
+    def record(title_num, xml_path, json_path, result):
+        elapsed, entry = result
+        manifest[os.path.basename(xml_path)] = entry
+        parsed.append(xml_path)
+        print(f"Parsed Title {title_num} in {elapsed:.1f}s: {json_path}")
+
+    def record_failure(title_num, xml_path, e):
+        manifest.pop(os.path.basename(xml_path), None)
+        failed.append((title_num, str(e)))
+        print(f"Failed to parse {xml_path}: {e}")
+
+    if workers > 1 and len(jobs) > 1:
+        print(f"Parsing with {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(parse_one_title, xml_path, json_path, streaming): (title_num, xml_path, json_path)
+                for title_num, xml_path, json_path in jobs
+            }
+            for future in as_completed(futures):
+                title_num, xml_path, json_path = futures[future]
+                try:
+                    record(title_num, xml_path, json_path, future.result())
+                except Exception as e:
+                    record_failure(title_num, xml_path, e)
+    else:
+        for title_num, xml_path, json_path in jobs:
+            print(f"Parsing Title {title_num}: {xml_path} -> {json_path}")
+            try:
+                record(title_num, xml_path, json_path, parse_one_title(xml_path, json_path, streaming))
+            except Exception as e:
+                record_failure(title_num, xml_path, e)
+    save_manifest(manifest, manifest_path)
+
+    elapsed = time.perf_counter() - start
+    total_mb = sum(os.path.getsize(p) for p in parsed) / (1024 * 1024)
+    print("\nSummary:")
+    print(f"  Titles parsed: {len(parsed)}")
+    print(f"  Titles skipped (unchanged): {len(skipped)}")
+    print(f"  Titles failed: {len(failed)} -> {[t for t, _ in failed]}")
+    print(f"  Wall clock: {elapsed:.1f}s, throughput: {total_mb / elapsed if elapsed else 0:.1f} MB/s "
+          f"({len(parsed) / elapsed if elapsed else 0:.2f} titles/s)")
+    return parsed, failed
 
 if __name__ == "__main__":
     print("parse_all_titles.py script started")
-    parse_all_titles(RAW_DIR)
+    parser = argparse.ArgumentParser(description="Parse all ECFR-title*.xml files to JSON")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (default: 1, sequential)")
+    parser.add_argument('--stream', action='store_true',
+                        help="use the streaming iterparse parser")
+    parser.add_argument('--force', action='store_true',
+                        help="re-parse every title even if its XML is unchanged")
+    parser.add_argument('--format', choices=FORMATS, default='json',
+                        help="storage format for the parsed titles (default: json)")
+    args = parser.parse_args()
+    parse_all_titles(RAW_DIR, workers=args.workers, streaming=args.stream, force=args.force, fmt=args.format)
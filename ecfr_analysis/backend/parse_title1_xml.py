@@ -1,58 +1,126 @@
 import os
+import sys
 import xml.etree.ElementTree as ET
 import json
+from parsed_store import open_parsed, write_parsed, storage_format, is_compact
 
 RAW_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'ecfr_analysis','data', 'raw'))
 xml_path = os.path.join(RAW_DIR, 'ECFR-title1.xml')
 json_path = os.path.join(RAW_DIR, 'title1_parsed.json')
+# Bump whenever a change to the parser alters its JSON output, so
+# parse_all_titles re-parses titles that were produced by an older version
+PARSER_VERSION = 1
+
+
+def get_texts(elem, tag):
+    # Get all text from all tags of a certain type under elem
+    return [ET.tostring(e, encoding='unicode', method='text').strip() for e in elem.findall(tag)]
+
+def get_all_text(elem):
+    # Recursively get all text in an element and its children
+    if elem is None:
+        return ''
+    text = elem.text or ''
+    for child in elem:
+        text += get_all_text(child)
+        if child.tail:
+            text += child.tail
+    return text
+
+def parse_section(section):
+    heading = section.findtext('HEAD', default='')
+    ps = section.findall('P')
+    paras = [get_all_text(p).strip() for p in ps]
+    return {
+        'heading': heading.strip(),
+        'paragraphs': paras
+    }
+
+def parse_part(part):
+    part_heading = part.findtext('HEAD', default='')
+    sections = []
+    for section in part.findall("DIV8[@TYPE='SECTION']"):
+        sections.append(parse_section(section))
+    return {
+        'part_heading': part_heading.strip(),
+        'sections': sections
+    }
+
+def is_part(elem):
+    return elem.tag == 'DIV5' and elem.get('TYPE') == 'PART'
+
+
+def iter_parts(xml_path):
+    # Incrementally parse the XML and yield each PART as soon as its closing
+    # tag is seen. Finished elements are cleared and detached from their
+    # parent so memory stays bounded by the size of a single PART.
+    stack = []
+    open_parts = 0
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if is_part(elem):
+                open_parts += 1
+            continue
+        stack.pop()
+        if is_part(elem):
+            open_parts -= 1
+            yield parse_part(elem)
+        elif open_parts:
+            # Still inside a PART; its children are needed by parse_part
+            continue
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def write_parts_json(parts, f, compact=False):
+    # Write {'parts': [...]} one part at a time, byte-for-byte identical to
+    # json.dump({'parts': parts}, f, indent=2), or to the minified
+    # separators=(',', ':') form when compact is set
+    if compact:
+        f.write('{"parts":[')
+        for i, part in enumerate(parts):
+            f.write((',' if i else '') + json.dumps(part, separators=(',', ':')))
+        f.write(']}')
+        return
+    wrote_any = False
+    for part in parts:
+        f.write(',\n    ' if wrote_any else '{\n  "parts": [\n    ')
+        f.write(json.dumps(part, indent=2).replace('\n', '\n    '))
+        wrote_any = True
+    f.write('\n  ]\n}' if wrote_any else '{\n  "parts": []\n}')
+
+
+def parse_title1_xml(xml_path, json_path, streaming=False):
+    # The output format (json, json.gz, json.zst) follows json_path's extension
+    if streaming:
+        # Write to a temporary file so a failure halfway through a title
+        # doesn't leave a truncated JSON file behind
+        fmt = storage_format(json_path)
+        tmp_path = f"{json_path[:-len(fmt)]}tmp.{fmt}"
+        try:
+            with open_parsed(tmp_path, 'w') as f:
+                write_parts_json(iter_parts(xml_path), f, compact=is_compact(json_path))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, json_path)
+        print(f"Parsed Title XML (streaming) and saved to {json_path}")
+        return
 
-def parse_title1_xml(xml_path, json_path):
     tree = ET.parse(xml_path)
     root = tree.getroot()
 
-    def get_texts(elem, tag):
-        # Get all text from all tags of a certain type under elem
-        return [ET.tostring(e, encoding='unicode', method='text').strip() for e in elem.findall(tag)]
-
-    def get_all_text(elem):
-        # Recursively get all text in an element and its children
-        if elem is None:
-            return ''
-        text = elem.text or ''
-        for child in elem:
-            text += get_all_text(child)
-            if child.tail:
-                text += child.tail
-        return text
-
-    def parse_section(section):
-        heading = section.findtext('HEAD', default='')
-        ps = section.findall('P')
-        paras = [get_all_text(p).strip() for p in ps]
-        return {
-            'heading': heading.strip(),
-            'paragraphs': paras
-        }
-
-    def parse_part(part):
-        part_heading = part.findtext('HEAD', default='')
-        sections = []
-        for section in part.findall("DIV8[@TYPE='SECTION']"):
-            sections.append(parse_section(section))
-        return {
-            'part_heading': part_heading.strip(),
-            'sections': sections
-        }
-
     # Find all PARTs (DIV5 with TYPE='PART')
     parts = []
     for part in root.findall(".//DIV5[@TYPE='PART']"):
         parts.append(parse_part(part))
 
     # Save as JSON
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump({'parts': parts}, f, indent=2)
+    write_parsed({'parts': parts}, json_path)
     print(f"Parsed Title 1 XML and saved to {json_path}")
 
 if __name__ == "__main__":
-    parse_title1_xml(xml_path, json_path)
+    parse_title1_xml(xml_path, json_path, streaming='--stream' in sys.argv[1:])
@@ -0,0 +1,81 @@
+import os
+import re
+import io
+import gzip
+import json
+
+# zstandard is optional: only needed for the .json.zst format
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Storage formats for titleN_parsed files, selected by file extension:
+#   json      - pretty-printed JSON (indent=2), the original format
+#   json.gz   - minified JSON, gzip-compressed
+#   json.zst  - minified JSON, zstd-compressed (needs zstandard)
+FORMATS = ('json', 'json.gz', 'json.zst')
+PARSED_NAME_RE = re.compile(r'title(\d+)_parsed\.(json(?:\.gz|\.zst)?)$')
+
+
+def storage_format(path):
+    for fmt in ('json.gz', 'json.zst'):
+        if path.endswith('.' + fmt):
+            return fmt
+    return 'json'
+
+
+def parsed_json_path(raw_dir, title_num, fmt='json'):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown storage format {fmt!r}; expected one of {FORMATS}")
+    return os.path.join(raw_dir, f'title{title_num}_parsed.{fmt}')
+
+
+def is_compact(path):
+    return storage_format(path) != 'json'
+
+
+def open_parsed(path, mode='r'):
+    # Text-mode handle for reading ('r') or writing ('w') a parsed title,
+    # (de)compressing transparently according to the extension
+    fmt = storage_format(path)
+    if fmt == 'json.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    if fmt == 'json.zst':
+        if zstandard is None:
+            raise ImportError("Reading or writing .json.zst files needs zstandard: pip install zstandard")
+        raw = open(path, mode + 'b')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def load_parsed(path):
+    with open_parsed(path) as f:
+        return json.load(f)
+
+
+def write_parsed(data, path):
+    with open_parsed(path, 'w') as f:
+        if is_compact(path):
+            json.dump(data, f, separators=(',', ':'))
+        else:
+            json.dump(data, f, indent=2)
+
+
+def find_parsed_titles(raw_dir):
+    # [(title number, path)] with one file per title; when a title exists in
+    # several formats the most recently written one wins
+    found = {}
+    for fname in os.listdir(raw_dir):
+        m = PARSED_NAME_RE.fullmatch(fname)
+        if not m:
+            continue
+        path = os.path.join(raw_dir, fname)
+        current = found.get(m.group(1))
+        if current is None or os.path.getmtime(path) > os.path.getmtime(current):
+            found[m.group(1)] = path
+    return sorted(found.items(), key=lambda item: int(item[0]))
@@ -0,0 +1,111 @@
+import numpy as np
+
+# Flesch-Kincaid grade level computed with NumPy over the code points of
+# all texts at once. Counting rules:
+#   words     - runs of word characters (same as regex \w+)
+#   syllables - runs of the vowels aeiouy, either case
+#   sentences - runs of text between '.', '!' or '?' that contain
+#               something other than whitespace
+#   tokens    - whitespace-separated tokens (same as len(text.split()))
+#   bytes     - UTF-8 encoded length
+
+_ASCII = np.arange(128)
+_ASCII_WORD = np.array([chr(c).isalnum() or chr(c) == '_' for c in _ASCII])
+_ASCII_SPACE = np.array([chr(c).isspace() for c in _ASCII])
+_VOWELS = np.zeros(128, dtype=bool)
+_VOWELS[[ord(c) for c in 'aeiouyAEIOUY']] = True
+_TERMINATORS = np.zeros(128, dtype=bool)
+_TERMINATORS[[ord(c) for c in '.!?']] = True
+
+
+def _classify(codes, ascii_table, predicate):
+    # Look up ASCII code points in a table; decide the (few) distinct
+    # non-ASCII code points with the str predicate
+    result = np.zeros(len(codes), dtype=bool)
+    ascii_mask = codes < 128
+    result[ascii_mask] = ascii_table[codes[ascii_mask]]
+    if not ascii_mask.all():
+        other = ~ascii_mask
+        uniques, inverse = np.unique(codes[other], return_inverse=True)
+        flags = np.array([predicate(chr(c)) for c in uniques], dtype=bool)
+        result[other] = flags[inverse]
+    return result
+
+
+def _run_starts(mask):
+    # Positions where a run of True values begins
+    starts = mask.copy()
+    starts[1:] &= ~mask[:-1]
+    return np.flatnonzero(starts)
+
+
+STAT_KEYS = ('sentences', 'words', 'syllables', 'tokens', 'bytes')
+
+
+def text_stats(texts):
+    # Sentence, word, syllable, token and byte counts for each text, from
+    # one pass over the concatenated texts. Returns a dict of integer
+    # arrays. The counts are additive, so totals for a group of texts
+    # (a part, a title) are sums of its members' counts.
+    texts = list(texts)
+    n = len(texts)
+    if not n:
+        return {key: np.zeros(0, dtype=np.int64) for key in STAT_KEYS}
+    # '.' between texts ends any open sentence and splits words
+    joined = '.'.join(texts)
+    codes = np.frombuffer(joined.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n)
+    offsets = np.zeros(n, dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=offsets[1:])
+
+    is_word = _classify(codes, _ASCII_WORD, lambda c: c.isalnum() or c == '_')
+    is_space = _classify(codes, _ASCII_SPACE, str.isspace)
+    ascii_codes = np.where(codes < 128, codes, 0)
+    is_vowel = _VOWELS[ascii_codes]
+    is_terminator = _TERMINATORS[ascii_codes]
+
+    # A sentence starts at the first non-space character of each segment
+    # between terminators
+    segment = np.cumsum(is_terminator)
+    content = np.flatnonzero(~is_terminator & ~is_space)
+    first = np.ones(len(content), dtype=bool)
+    first[1:] = segment[content[1:]] != segment[content[:-1]]
+
+    # Tokens are split by whitespace and by the separators between texts
+    is_token = ~is_space
+    is_token[offsets[1:] - 1] = False
+
+    # UTF-8 width of each code point, summed per text via a running total
+    widths = 1 + (codes >= 0x80) + (codes >= 0x800) + (codes >= 0x10000)
+    running = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(widths, out=running[1:])
+
+    def per_text(positions):
+        owner = np.searchsorted(offsets, positions, side='right') - 1
+        return np.bincount(owner, minlength=n)
+
+    return {
+        'sentences': per_text(content[first]),
+        'words': per_text(_run_starts(is_word)),
+        'syllables': per_text(_run_starts(is_vowel)),
+        'tokens': per_text(_run_starts(is_token)),
+        'bytes': running[offsets + lengths] - running[offsets]
+    }
+
+
+def grades_from_counts(words, sentences, syllables):
+    words = np.maximum(np.asarray(words, dtype=float), 1)
+    sentences = np.maximum(np.asarray(sentences, dtype=float), 1)
+    syllables = np.asarray(syllables, dtype=float)
+    return np.round(0.39 * (words / sentences) + 11.8 * (syllables / words) - 15.59, 2)
+
+
+def flesch_kincaid_grades(texts):
+    # Grade for each text; empty texts get 0
+    stats = text_stats(texts)
+    grades = grades_from_counts(stats['words'], stats['sentences'], stats['syllables'])
+    return np.where(stats['words'] > 0, grades, 0.0)
+
+
+def flesch_kincaid_grade(text):
+    return float(flesch_kincaid_grades([text])[0])
@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+import sqlite3
+from parsed_store import load_parsed
+from title_store import title_id_range, title_fingerprint, record_title, update_title_store
+
+SEARCH_DB = 'search_index.sqlite'
+# Bump when the schema or tokenizer changes so every title is re-indexed
+SEARCH_INDEX_VERSION = 1
+
+# Paragraphs live in a plain table, one row per paragraph; paragraph_fts
+# is an external-content FTS5 index over it, kept in sync by the triggers.
+# Paragraph ids come from title_store.title_id_range, so each title is one
+# contiguous id range: replacing a title and filtering searches by title
+# are rowid range scans.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id INTEGER PRIMARY KEY,
+    title INTEGER NOT NULL,
+    part_heading TEXT,
+    section_heading TEXT,
+    paragraph_index INTEGER,
+    text TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS paragraph_fts USING fts5(
+    text, section_heading,
+    content='paragraphs', content_rowid='id',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS paragraphs_ai AFTER INSERT ON paragraphs BEGIN
+    INSERT INTO paragraph_fts (rowid, text, section_heading)
+    VALUES (new.id, new.text, new.section_heading);
+END;
+CREATE TRIGGER IF NOT EXISTS paragraphs_ad AFTER DELETE ON paragraphs BEGIN
+    INSERT INTO paragraph_fts (paragraph_fts, rowid, text, section_heading)
+    VALUES ('delete', old.id, old.text, old.section_heading);
+END;
+CREATE TABLE IF NOT EXISTS indexed_titles (
+    title INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+'''
+
+def open_search_index(processed_dir):
+    conn = sqlite3.connect(os.path.join(processed_dir, SEARCH_DB))
+    conn.executescript(SCHEMA)
+    return conn
+
+def paragraph_rows(title_num, data):
+    paragraph_id = title_id_range(title_num)[0]
+    for part in data.get('parts', []):
+        part_heading = part.get('part_heading', '')
+        for section in part.get('sections', []):
+            section_heading = section.get('heading', '')
+            for paragraph_index, para in enumerate(section.get('paragraphs', [])):
+                yield (paragraph_id, int(title_num), part_heading, section_heading, paragraph_index, para)
+                paragraph_id += 1
+
+def index_title(conn, title_num, path):
+    data = load_parsed(path)
+    entry = title_fingerprint(path, 'index_version', SEARCH_INDEX_VERSION)
+    with conn:
+        conn.execute('DELETE FROM paragraphs WHERE id BETWEEN ? AND ?', title_id_range(title_num))
+        conn.executemany(
+            'INSERT INTO paragraphs VALUES (?, ?, ?, ?, ?, ?)', paragraph_rows(title_num, data)
+        )
+        record_title(conn, 'indexed_titles', title_num, path, entry)
+
+def remove_title(conn, title_num):
+    with conn:
+        conn.execute('DELETE FROM paragraphs WHERE id BETWEEN ? AND ?', title_id_range(title_num))
+        conn.execute('DELETE FROM indexed_titles WHERE title = ?', (int(title_num),))
+
+def update_search_index(raw_dir, processed_dir, force=False):
+    # Re-index only titles whose parsed file changed (same size/mtime/hash
+    # check as the parse manifest) and drop titles that no longer exist.
+    # Returns the list of re-indexed title numbers.
+    conn = open_search_index(processed_dir)
+    try:
+        changed = update_title_store(
+            conn, 'indexed_titles', raw_dir, 'index_version', SEARCH_INDEX_VERSION,
+            index_title, remove_title, 'search index', force
+        )
+        if changed:
+            # Merge the index segments written above for faster queries
+            with conn:
+                conn.execute("INSERT INTO paragraph_fts (paragraph_fts) VALUES ('optimize')")
+        return changed
+    finally:
+        conn.close()
+
+def match_expression(query):
+    # Turn free text into an FTS5 expression: every word must match, each
+    # one quoted so user input can never be a syntax error. A trailing '*'
+    # on a word keeps prefix matching (e.g. "regulat*").
+    terms = []
+    for word, star in re.findall(r'(\w+)(\*?)', query):
+        terms.append(f'"{word}"{star}')
+    return ' '.join(terms)
+
+def search(conn, query, titles=None, page=1, per_page=20):
+    # Ranked (BM25, matches in body text weighted above section headings),
+    # paginated paragraph matches, optionally restricted to some titles.
+    # Ranking and counting run on the FTS index alone; paragraph details
+    # and snippets are only fetched for the requested page.
+    expression = match_expression(query)
+    response = {'query': query, 'total': 0, 'page': page, 'per_page': per_page, 'results': []}
+    if not expression:
+        return response
+    where = 'paragraph_fts MATCH ?'
+    params = [expression]
+    if titles:
+        where += f" AND ({' OR '.join('rowid BETWEEN ? AND ?' for _ in titles)})"
+        for title in titles:
+            params.extend(title_id_range(title))
+    response['total'] = conn.execute(
+        f'SELECT COUNT(*) FROM paragraph_fts WHERE {where}', params
+    ).fetchone()[0]
+    ranked = conn.execute(
+        f'SELECT rowid, bm25(paragraph_fts, 1.0, 0.5) AS score FROM paragraph_fts WHERE {where} '
+        'ORDER BY score LIMIT ? OFFSET ?',
+        params + [per_page, (page - 1) * per_page]
+    ).fetchall()
+    if not ranked:
+        return response
+    ids = [rowid for rowid, _ in ranked]
+    placeholders = ', '.join('?' for _ in ids)
+    details = {
+        row[0]: row[1:]
+        for row in conn.execute(
+            'SELECT p.id, p.title, p.part_heading, p.section_heading, p.paragraph_index, '
+            "snippet(paragraph_fts, 0, '[', ']', '…', 24) "
+            'FROM paragraph_fts JOIN paragraphs p ON p.id = paragraph_fts.rowid '
+            f'WHERE paragraph_fts MATCH ? AND paragraph_fts.rowid IN ({placeholders})',
+            [expression] + ids
+        )
+    }
+    for rowid, score in ranked:
+        title, part_heading, section_heading, paragraph_index, snippet = details[rowid]
+        response['results'].append({
+            'title': title,
+            'part_heading': part_heading,
+            'section_heading': section_heading,
+            'paragraph_index': paragraph_index,
+            'snippet': snippet,
+            'score': round(-score, 3)
+        })
+    return response
+
+if __name__ == "__main__":
+    # Build or incrementally update the index:
+    #   python search_index.py [--force]
+    data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+    update_search_index(
+        os.path.join(data_dir, 'raw'),
+        os.path.join(data_dir, 'processed'),
+        force='--force' in sys.argv[1:]
+    )
@@ -0,0 +1,63 @@
+import os
+import json
+import time
+from manifest import file_fingerprint, is_unchanged
+from parsed_store import find_parsed_titles
+
+# Bookkeeping shared by the SQLite stores that hold rows per parsed title
+# (search_index.py, metrics_store.py). Row ids are (title << TITLE_SHIFT) +
+# position in the title, so rows keep document order and a title is
+# replaced or filtered with one id range. Each store keeps a registry table
+# (title, file, fingerprint) so an update only redoes titles whose parsed
+# file changed.
+
+TITLE_SHIFT = 32
+
+
+def title_id_range(title_num):
+    first = int(title_num) << TITLE_SHIFT
+    return first, first + (1 << TITLE_SHIFT) - 1
+
+
+def title_fingerprint(path, version_key, version):
+    # Parsed file fingerprint plus the store's version, saved with the rows
+    entry = file_fingerprint(path)
+    entry[version_key] = version
+    return entry
+
+
+def record_title(conn, registry, title_num, path, entry):
+    conn.execute(
+        f'INSERT OR REPLACE INTO {registry} VALUES (?, ?, ?)',
+        (int(title_num), os.path.basename(path), json.dumps(entry))
+    )
+
+
+def update_title_store(conn, registry, raw_dir, version_key, version, store_title, remove_title,
+                       name, force=False):
+    # Call store_title(conn, title_num, path) for every parsed title whose
+    # file, storage format or store version changed since it was stored, and
+    # remove_title(conn, title) for stored titles that no longer exist.
+    # Returns the list of updated title numbers.
+    stored = {
+        title: (fname, json.loads(fingerprint))
+        for title, fname, fingerprint in conn.execute(f'SELECT title, file, fingerprint FROM {registry}')
+    }
+    titles = find_parsed_titles(raw_dir)
+    current = {int(title_num) for title_num, _ in titles}
+    for title in sorted(set(stored) - current):
+        remove_title(conn, title)
+        print(f"Removed Title {title} from the {name}")
+    changed = []
+    for title_num, path in titles:
+        fname, entry = stored.get(int(title_num), (None, None))
+        if (not force and fname == os.path.basename(path)
+                and entry.get(version_key) == version
+                and is_unchanged(path, entry)):
+            continue
+        start = time.perf_counter()
+        store_title(conn, title_num, path)
+        changed.append(title_num)
+        print(f"Updated Title {title_num} in the {name} in {time.perf_counter() - start:.1f}s")
+    print(f"{name.capitalize()}: {len(changed)} titles updated, {len(titles) - len(changed)} unchanged")
+    return changed
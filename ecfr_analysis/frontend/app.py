@@ -2,19 +2,29 @@
 import streamlit as st
 import json
 import os
+import sys
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
+import requests
 from typing import List
 
 
 # Set data paths
 RAW_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'raw'))
 PROCESSED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'processed'))
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+# Shared backend modules (history store, etc.)
+sys.path.insert(0, BACKEND_DIR)
+from history_store import open_history, list_history_files, query_history_rows
+from manifest import file_sha256
+from analysis import compute_file_metrics
+from parsed_store import PARSED_NAME_RE, find_parsed_titles
+from search_index import SEARCH_DB, open_search_index, search
+from network_view import render_network
 
 def get_available_titles() -> List[str]:
-    files = os.listdir(RAW_DIR)
-    titles = [f for f in files if f.startswith('title') and f.endswith('_parsed.json')]
+    # One file per title, in whichever storage format (.json/.json.gz/.json.zst)
+    titles = [os.path.basename(path) for _, path in find_parsed_titles(RAW_DIR)]
     return sorted(titles)
 
 def get_title_label(fname):
@@ -34,97 +44,86 @@ st.markdown('''
 ''', unsafe_allow_html=True)
 
 # Title selection for multi-title support
-import re
-available_titles = sorted(available_titles, key=lambda x: int(re.search(r'title(\d+)_parsed\.json', x).group(1))
+available_titles = sorted(available_titles, key=lambda x: int(PARSED_NAME_RE.search(x).group(1))
 )
 
 
 selected_titles = st.multiselect('Select Title(s) to analyze', available_titles, default=available_titles[:1], format_func=get_title_label, help="Choose one or more titles to view and compare.")
-st.info('Currently, only the Metrics Table supports multi-title selection. Other dashboard features are not yet implemented for multi-title and will display informational messages below.')
+st.info('The Metrics Table, Part and Section Metrics and Search Regulations (with "Only search the selected titles") cover every selected title. Citation counts and the cross-reference network show Title 1 data.')
 if not selected_titles:
     st.warning('Please select at least one title.')
     st.stop()
 
 # Load processed data (assume one set for now, but structure for multi-title)
 
-import numpy as np
-import hashlib
-import re as regex
+# Flask API (backend/app.py)
+API_URL = 'http://localhost:5000'
+
+@st.cache_resource
+def api_response_cache():
+    # url -> (ETag, parsed JSON), shared across reruns and sessions
+    return {}
+
+def fetch_api_json(url, params=None):
+    # Conditional GET: resend the last ETag so an unchanged resource comes
+    # back as an empty 304 and the cached copy is reused
+    cache = api_response_cache()
+    key = requests.Request('GET', url, params=params).prepare().url
+    cached = cache.get(key)
+    headers = {'If-None-Match': cached[0]} if cached else {}
+    try:
+        response = requests.get(key, headers=headers, timeout=30)
+    except requests.RequestException:
+        return cached[1] if cached else None
+    if response.status_code == 304 and cached:
+        return cached[1]
+    if not response.ok:
+        return None
+    data = response.json()
+    if response.headers.get('ETag'):
+        cache[key] = (response.headers['ETag'], data)
+    return data
 
 # Caching for processed data
 @st.cache_data(show_spinner=False)
-def load_json(path):
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
-
-# Load and aggregate metrics for selected titles
-def flesch_kincaid(text):
-    # Basic Flesch-Kincaid grade level calculation
-    sentences = regex.split(r'[.!?]+', text)
-    sentences = [s for s in sentences if s.strip()]
-    num_sentences = max(len(sentences), 1)
-    words = regex.findall(r'\w+', text)
-    num_words = max(len(words), 1)
-    syllables = sum(len(regex.findall(r'[aeiouyAEIOUY]+', w)) for w in words)
-    if num_words == 0:
-        return np.nan
-    return round(0.39 * (num_words / num_sentences) + 11.8 * (syllables / num_words) - 15.59, 2)
-
-def compute_metrics(parsed):
-    # Flatten all text from all paragraphs
-    all_text = []
-    word_count = 0
-    if 'parts' in parsed:
-        for part in parsed['parts']:
-            for section in part.get('sections', []):
-                for para in section.get('paragraphs', []):
-                    all_text.append(para)
-    text = ' '.join(all_text)
-    word_count = len(regex.findall(r'\w+', text))
-    readability = flesch_kincaid(text) if text else np.nan
-    checksum = hashlib.md5(text.encode('utf-8')).hexdigest() if text else ''
-    return word_count, readability, checksum
+def load_metrics_table(metrics_hash):
+    # Per-title metrics written by the backend analysis (metrics.json);
+    # cached until the file's hash changes
+    with open(os.path.join(PROCESSED_DIR, 'metrics.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@st.cache_data(show_spinner=False)
+def compute_title_metrics(path, size, mtime):
+    # Fallback for titles parsed after the last analysis run, cached per
+    # file version; same definitions as the backend table
+    return compute_file_metrics(path)
 
 def load_selected_titles_metrics(selected_titles):
+    metrics_path = os.path.join(PROCESSED_DIR, 'metrics.json')
+    table = load_metrics_table(file_sha256(metrics_path)) if os.path.exists(metrics_path) else {}
     data = []
     for fname in selected_titles:
-        path = os.path.join(RAW_DIR, fname)
-        parsed = load_json(path)
-        if parsed:
-            # Compute metrics if missing
-            word_count = parsed.get('word_count')
-            readability = parsed.get('readability')
-            checksum = parsed.get('checksum')
-            if word_count is None or readability is None or checksum is None:
-                word_count, readability, checksum = compute_metrics(parsed)
-            metrics = {
-                'Title': get_title_label(fname),
-                'Word Count': word_count,
-                'Readability': readability,
-                'Checksum': checksum,
-            }
-            data.append(metrics)
+        metrics = table.get(fname)
+        if metrics is None:
+            path = os.path.join(RAW_DIR, fname)
+            st_info = os.stat(path)
+            metrics = compute_title_metrics(path, st_info.st_size, st_info.st_mtime)
+        data.append({
+            'Title': get_title_label(fname),
+            'Word Count': metrics['word_count'],
+            'Readability': metrics['readability'],
+            'Checksum': metrics['checksum'],
+        })
     return pd.DataFrame(data)
 
+# Metrics Table for selected titles
+st.header('Metrics Table')
 st.markdown(
     'Displays overall metrics (word count, readability, checksum) for each selected title. '
     '<span title="Word count: total words in the file. Readability: Flesch-Kincaid '
     'grade level. Checksum: MD5 hash for file integrity.">[?]</span>',
     unsafe_allow_html=True
-
 )
-
-# Display metrics table for selected titles
-metrics_df = load_selected_titles_metrics(selected_titles)
-st.dataframe(metrics_df, use_container_width=True)
-
- 
-
-
-# Metrics Table for selected titles
-st.header('Metrics Table')
 metrics_df = load_selected_titles_metrics(selected_titles)
 if not metrics_df.empty:
     st.dataframe(metrics_df, use_container_width=True)
@@ -134,89 +133,83 @@ else:
     st.warning('No metrics available for selected titles.')
 
 
-# Part/Section Metrics Table (show Title 1 data only)
+# Part/Section Metrics Table for selected titles; filtering, sorting and
+# paging run in the API, which returns only the visible page
 st.header('Part and Section Metrics')
 st.markdown('Explore metrics for each part and section. Use filters and download the table for further analysis. Outliers are highlighted. <span title="Word count: total words in the part/section. Readability: Flesch-Kincaid grade level.">❓</span>', unsafe_allow_html=True)
-part_section_metrics = None
-import_path = os.path.join(PROCESSED_DIR, 'part_section_metrics.json')
-if os.path.exists(import_path):
-    with open(import_path, 'r', encoding='utf-8') as f:
-        part_section_metrics = json.load(f)
-if part_section_metrics:
-    df_ps = pd.DataFrame(part_section_metrics)
-    # Filtering
-    level_options = df_ps['level'].unique().tolist()
+ps_titles = [('title', int(PARSED_NAME_RE.search(f).group(1))) for f in selected_titles]
+facets = fetch_api_json(f"{API_URL}/api/part_section_metrics/facets", ps_titles)
+if facets and facets['parts']:
     selected_level = st.selectbox(
-        'Show level', ['all'] + level_options,
+        'Show level', ['all'] + facets['levels'],
         help="Choose to view all, part, or section metrics."
     )
-    if selected_level != 'all':
-        df_ps = df_ps[df_ps['level'] == selected_level]
-    part_options = df_ps['part_heading'].unique().tolist()
     selected_part = st.selectbox(
-        'Filter by part', ['all'] + part_options,
+        'Filter by part', ['all'] + facets['parts'],
         help="Filter by part heading."
     )
-    if selected_part != 'all':
-        df_ps = df_ps[df_ps['part_heading'] == selected_part]
+    low_read, high_read = facets['readability']
     # Custom readability filter
     min_read = st.number_input(
         'Minimum readability',
-        value=float(df_ps['readability'].min()),
+        value=float(low_read or 0),
         step=0.1,
         help="Show only parts/sections above this readability."
     )
     max_read = st.number_input(
         'Maximum readability',
-        value=float(df_ps['readability'].max()),
+        value=float(high_read or 0),
         step=0.1,
         help="Show only parts/sections below this readability."
     )
-    df_ps = df_ps[(df_ps['readability'] >= min_read) & (df_ps['readability'] <= max_read)]
     # Sorting
     sort_col = st.selectbox(
         'Sort by', ['word_count', 'readability'],
         help="Sort by word count or readability."
     )
     sort_asc = st.checkbox('Sort ascending', value=False)
-    df_ps = df_ps.sort_values(sort_col, ascending=sort_asc)
-    # Show only key columns
     display_cols = [
-        'level', 'part_heading', 'section_heading', 'word_count', 'readability'
+        'title', 'level', 'part_heading', 'section_heading', 'word_count', 'readability'
     ]
     page_size_ps = st.number_input(
         'Rows per page (part/section)',
         min_value=5, max_value=100, value=20, step=5, key='ps_page_size'
     )
-    total_rows_ps = len(df_ps)
-    total_pages_ps = (total_rows_ps - 1) // page_size_ps + 1
     page_ps = st.number_input(
-        'Page (part/section)', min_value=1, max_value=total_pages_ps, value=1, step=1, key='ps_page'
-    )
-    start_ps = (page_ps - 1) * page_size_ps
-    end_ps = start_ps + page_size_ps
-    st.dataframe(
-        df_ps[display_cols].iloc[start_ps:end_ps],
-        hide_index=True,
-        use_container_width=True
+        'Page (part/section)', min_value=1, value=1, step=1, key='ps_page'
     )
-    st.subheader('Compare Parts/Sections')
-    compare_rows = st.multiselect(
-        'Select parts/sections to compare',
-        df_ps.index,
-        format_func=lambda i: (
-            f"{df_ps.loc[i, 'part_heading']} | "
-            f"{df_ps.loc[i, 'section_heading']}"
-        ),
-        help="Select multiple rows to compare side by side."
-    )
-    if compare_rows:
-        st.dataframe(
-            df_ps.loc[compare_rows][display_cols]
-            .set_index(['part_heading', 'section_heading'])
+    ps_params = ps_titles + [
+        ('min_readability', min_read), ('max_readability', max_read),
+        ('sort', sort_col), ('order', 'asc' if sort_asc else 'desc'),
+        ('page', int(page_ps)), ('per_page', int(page_size_ps))
+    ]
+    if selected_level != 'all':
+        ps_params.append(('level', selected_level))
+    if selected_part != 'all':
+        ps_params.append(('part', selected_part))
+    ps_page = fetch_api_json(f"{API_URL}/api/part_section_metrics/rows", ps_params)
+    if ps_page:
+        total_pages_ps = max((ps_page['total'] - 1) // int(page_size_ps) + 1, 1)
+        st.caption(f"{ps_page['total']} rows, page {int(page_ps)} of {total_pages_ps}")
+        df_ps = pd.DataFrame(ps_page['rows'], columns=display_cols)
+        st.dataframe(df_ps, hide_index=True, use_container_width=True)
+        st.subheader('Compare Parts/Sections')
+        compare_rows = st.multiselect(
+            'Select parts/sections on this page to compare',
+            df_ps.index,
+            format_func=lambda i: (
+                f"{df_ps.loc[i, 'part_heading']} | "
+                f"{df_ps.loc[i, 'section_heading']}"
+            ),
+            help="Select multiple rows to compare side by side."
         )
+        if compare_rows:
+            st.dataframe(
+                df_ps.loc[compare_rows][display_cols]
+                .set_index(['part_heading', 'section_heading'])
+            )
 else:
-    st.warning('part_section_metrics.json not found.')
+    st.warning('Part/section metrics unavailable. Run backend/metrics_store.py and start the API.')
 
 
 # Citation Counts Table (show Title 1 data only)
@@ -248,11 +241,14 @@ else:
 st.header('Cross-Reference Network')
 st.markdown('Visualizes how sections and parts reference each other. Nodes with many connections may be central to the regulation.')
 graph_data = None
-import requests
-
 # Load available parts and sections for selection
 all_parts = []
 all_sections = []
+part_section_metrics = None
+import_path = os.path.join(PROCESSED_DIR, 'part_section_metrics.json')
+if os.path.exists(import_path):
+    with open(import_path, 'r', encoding='utf-8') as f:
+        part_section_metrics = json.load(f)
 if part_section_metrics:
     df_ps = pd.DataFrame(part_section_metrics)
     all_parts = df_ps['part_heading'].dropna().unique().tolist()
@@ -261,70 +257,102 @@ if part_section_metrics:
 selected_parts = st.multiselect('Select Parts for Network Graph', all_parts)
 selected_sections = st.multiselect('Select Sections for Network Graph', all_sections)
 
-params = []
-for part in selected_parts:
-    params.append(f"part={part}")
-for section in selected_sections:
-    params.append(f"section={section}")
-query_string = "&".join(params)
-api_url = f"http://localhost:5000/api/cross_reference_graph"
-if query_string:
-    api_url += f"?{query_string}"
-
-response = requests.get(api_url)
-if response.ok:
-    graph_data = response.json()
+network_cols = st.columns(2)
+reduce_label = network_cols[0].selectbox(
+    'Simplify large graphs', ['Top nodes by degree', 'Merge sections into parts', 'Full graph'],
+    help="Large graphs are reduced on the server before drawing."
+)
+max_nodes = network_cols[1].number_input('Nodes to keep', min_value=50, max_value=100000, value=2000, step=500,
+                                         disabled=reduce_label != 'Top nodes by degree')
+reduce = {'Top nodes by degree': 'degree', 'Merge sections into parts': 'part'}.get(reduce_label)
+
+@st.cache_data(show_spinner=False)
+def load_network_view(params, graph_mtime):
+    # Layout view from the API, fetched once per graph version and filter
+    # choice instead of on every rerun. Failures raise so they are not
+    # cached and the next rerun asks the API again.
+    view = fetch_api_json(f"{API_URL}/api/cross_reference_graph/layout", list(params))
+    if view is None:
+        raise ConnectionError('cross-reference layout unavailable')
+    return view
+
+graph_path = os.path.join(PROCESSED_DIR, 'cross_reference_graph.json')
+params = [('part', part) for part in selected_parts] + [('section', section) for section in selected_sections]
+if reduce:
+    params.append(('reduce', reduce))
+if reduce == 'degree':
+    params.append(('max_nodes', int(max_nodes)))
+graph_view = None
+graph_error = 'cross_reference_graph.json not found.'
+if os.path.exists(graph_path):
+    try:
+        graph_view = load_network_view(tuple(params), os.path.getmtime(graph_path))
+    except ConnectionError:
+        graph_error = f'Cross-reference network unavailable; start the API at {API_URL}.'
+if graph_view:
+    st.caption(f"Showing {len(graph_view['nodes'])} of {graph_view['total_nodes']} nodes and "
+               f"{len(graph_view['edges'])} connections. Drag to pan, scroll to zoom, double-click to reset.")
+    render_network(graph_view, height=600)
+    st.download_button('Download Network View (JSON)', json.dumps(graph_view), 'cross_reference_network.json', 'application/json')
+else:
+    st.warning(graph_error)
+
+# Ranked from the precomputed graph analytics store (backend/graph_analytics.py)
+st.subheader('Most Central Sections')
+st.markdown('Ranked by PageRank over the cross-reference graph: sections cited by other well-cited sections rank highest. <span title="In/out degree: references received/made. Component: connected group of nodes (0 is the largest). Community: cluster of nodes that reference each other.">❓</span>', unsafe_allow_html=True)
+central_cols = st.columns(3)
+central_type = central_cols[0].selectbox('Node type', ['section', 'part', 'all'], key='central_type')
+central_sort = central_cols[1].selectbox('Rank by', ['pagerank', 'in_degree', 'out_degree'], key='central_sort')
+central_count = central_cols[2].number_input('Show top', min_value=5, max_value=500, value=20, step=5, key='central_count')
+central_params = [('sort', central_sort), ('per_page', int(central_count))]
+if central_type != 'all':
+    central_params.append(('type', central_type))
+central = fetch_api_json(f"{API_URL}/api/cross_reference_graph/analytics", central_params)
+if central and central['rows']:
+    summary = central.get('summary') or {}
+    if summary:
+        st.caption(f"{summary['nodes']} nodes, {summary['resolved_edges']} resolved references, "
+                   f"{summary['components']} components (largest {summary['largest_component']}), "
+                   f"{summary['communities']} communities (largest {summary['largest_community']})")
+    central_columns = ['node', 'part', 'pagerank', 'in_degree', 'out_degree', 'component', 'community']
+    st.dataframe(pd.DataFrame(central['rows'], columns=central_columns), hide_index=True, use_container_width=True)
 else:
-    graph_data = None
-if graph_data:
-    G = nx.DiGraph()
-    for node in graph_data['nodes']:
-        G.add_node(node['id'], type=node.get('type', ''))
-    for edge in graph_data['edges']:
-        # Add edge with label as an attribute
-        G.add_edge(edge['source'], edge['target'], label=edge.get('label', ''))
-    plt.figure(figsize=(12, 8))
-    pos = nx.spring_layout(G, k=0.5, iterations=50)
-    nx.draw(G, pos, with_labels=True, node_size=500, font_size=8, arrows=True)
-    # Draw edge labels
-    edge_labels = nx.get_edge_attributes(G, 'label')
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=7)
-    st.pyplot(plt)
-    import io
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    st.download_button('Download Network Graph (PNG)', buf.getvalue(), 'cross_reference_network.png', 'image/png')
+    st.warning('Graph analytics unavailable. Run backend/graph_analytics.py and start the API.')
+
+# Full-text search across every indexed title
+st.header('Search Regulations')
+st.markdown('Search the text of every paragraph in the CFR. Results are ranked by relevance; use `word*` for prefix matches.')
+if os.path.exists(os.path.join(PROCESSED_DIR, SEARCH_DB)):
+    search_query = st.text_input('Search text', help="All words must appear in the paragraph.")
+    only_selected = st.checkbox('Only search the selected titles')
+    if search_query:
+        search_page = st.number_input('Results page', min_value=1, value=1, step=1)
+        search_titles = [int(PARSED_NAME_RE.search(f).group(1)) for f in selected_titles] if only_selected else None
+        search_conn = open_search_index(PROCESSED_DIR)
+        found = search(search_conn, search_query, titles=search_titles, page=int(search_page), per_page=20)
+        search_conn.close()
+        st.caption(f"{found['total']} matching paragraphs")
+        if found['results']:
+            st.dataframe(pd.DataFrame(found['results']), use_container_width=True)
 else:
-    st.warning('cross_reference_graph.json not found.')
+    st.warning('No search index found. Run backend/search_index.py first.')
 
 # Historical Trends (show Title 1 data only)
 st.header('Historical Trends')
 st.markdown('Track changes in word count and readability over time for each file.')
-metrics_history = None
-import_path = os.path.join(PROCESSED_DIR, 'metrics_history.json')
-if os.path.exists(import_path):
-    with open(import_path, 'r', encoding='utf-8') as f:
-        metrics_history = json.load(f)
-if metrics_history:
-    records = []
-    for entry in metrics_history:
-        ts = entry['timestamp']
-        for fname, metrics in entry['metrics'].items():
-            records.append({
-                'timestamp': ts,
-                'file': fname,
-                'word_count': metrics.get('word_count', 0),
-                'readability': metrics.get('readability', 0)
-            })
-    df_hist = pd.DataFrame(records)
-    files = df_hist['file'].unique()
-    selected_file = st.selectbox('Select file for trend analysis', files)
-    df_file = df_hist[df_hist['file'] == selected_file].sort_values('timestamp')
+history_conn = open_history(PROCESSED_DIR)
+history_files = list_history_files(history_conn)
+if history_files:
+    selected_file = st.selectbox('Select file for trend analysis', history_files)
+    # Only the selected file's rows are read from the store
+    df_file = pd.DataFrame(query_history_rows(history_conn, files=[selected_file]))
+    df_file = df_file[['timestamp', 'file', 'word_count', 'readability']].fillna(0)
     st.line_chart(df_file.set_index('timestamp')[['word_count', 'readability']])
     csv_hist = df_file.to_csv(index=False).encode('utf-8')
     st.download_button('Download Historical Trends (CSV)', csv_hist, 'metrics_history.csv', 'text/csv')
 else:
-    st.warning('metrics_history.json not found.')
+    st.warning('No metrics history found. Run the analysis pipeline first.')
+history_conn.close()
 
 st.markdown('---')
 st.caption('eCFR Regulatory Analysis Website | Streamlit Prototype')
@@ -0,0 +1,167 @@
+import json
+import streamlit.components.v1 as components
+
+# Canvas renderer for the cross-reference network. Draws a layout view from
+# /api/cross_reference_graph/layout (nodes with x/y in the unit square,
+# edges as [source, target, weight] index triples) in the browser, so
+# tens of thousands of edges stay interactive: drag to pan, scroll to zoom,
+# hover a node for its name and degree.
+
+NODE_COLORS = {
+    'part': '#1f77b4',
+    'section': '#ff7f0e',
+    'title': '#2ca02c'
+}
+
+TEMPLATE = '''
+<div style="position:relative">
+<canvas id="network" style="width:100%;height:__HEIGHT__px;border:1px solid #ddd;cursor:grab"></canvas>
+<div id="tip" style="position:absolute;display:none;pointer-events:none;background:rgba(255,255,255,.95);
+     border:1px solid #aaa;padding:2px 6px;font:12px sans-serif;max-width:420px"></div>
+</div>
+<script>
+const view = __VIEW__;
+const colors = __COLORS__;
+const canvas = document.getElementById('network');
+const tip = document.getElementById('tip');
+const ctx = canvas.getContext('2d');
+const nodes = view.nodes;
+const edges = view.edges;
+const ratio = window.devicePixelRatio || 1;
+let width = 0, height = 0, scale = 1, panX = 0, panY = 0, hovered = -1, pending = false;
+
+// reduce() rather than Math.max(...list), which overflows on large graphs
+const maxOf = values => values.reduce((a, b) => Math.max(a, b), 1);
+const maxDegree = maxOf(nodes.map(n => n.degree));
+const maxSize = maxOf(nodes.map(n => n.size));
+const radius = nodes.map(n => 2 + 6 * Math.sqrt(Math.max(n.degree / maxDegree, n.size / maxSize)));
+const maxWeight = maxOf(edges.map(e => e[2]));
+
+function resize() {
+  width = canvas.clientWidth;
+  height = canvas.clientHeight;
+  canvas.width = width * ratio;
+  canvas.height = height * ratio;
+  const side = Math.min(width, height) * 0.9;
+  scale = side;
+  panX = (width - side) / 2;
+  panY = (height - side) / 2;
+  draw();
+}
+
+function sx(n) { return panX + n.x * scale; }
+function sy(n) { return panY + n.y * scale; }
+
+function draw() {
+  pending = false;
+  ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+  ctx.clearRect(0, 0, width, height);
+  // Edges in a few alpha buckets, one path each, so large graphs draw fast
+  const buckets = [[], [], []];
+  for (const e of edges) {
+    buckets[Math.min(2, Math.floor(3 * e[2] / (maxWeight + 1)))].push(e);
+  }
+  ctx.lineWidth = 0.6;
+  buckets.forEach((bucket, level) => {
+    if (!bucket.length) return;
+    ctx.strokeStyle = `rgba(90,90,90,${0.15 + 0.3 * level})`;
+    ctx.beginPath();
+    for (const [s, t] of bucket) {
+      ctx.moveTo(sx(nodes[s]), sy(nodes[s]));
+      ctx.lineTo(sx(nodes[t]), sy(nodes[t]));
+    }
+    ctx.stroke();
+  });
+  const zoom = Math.sqrt(scale / (Math.min(width, height) * 0.9));
+  for (let i = 0; i < nodes.length; i++) {
+    const x = sx(nodes[i]), y = sy(nodes[i]);
+    if (x < -20 || y < -20 || x > width + 20 || y > height + 20) continue;
+    ctx.fillStyle = colors[nodes[i].type] || '#7f7f7f';
+    ctx.beginPath();
+    ctx.arc(x, y, radius[i] * Math.min(zoom, 3), 0, 2 * Math.PI);
+    ctx.fill();
+  }
+  if (hovered >= 0) {
+    const n = nodes[hovered];
+    ctx.strokeStyle = '#d62728';
+    ctx.lineWidth = 1.5;
+    ctx.beginPath();
+    for (const [s, t] of edges) {
+      if (s === hovered || t === hovered) {
+        ctx.moveTo(sx(nodes[s]), sy(nodes[s]));
+        ctx.lineTo(sx(nodes[t]), sy(nodes[t]));
+      }
+    }
+    ctx.stroke();
+    ctx.beginPath();
+    ctx.arc(sx(n), sy(n), radius[hovered] * Math.min(zoom, 3) + 2, 0, 2 * Math.PI);
+    ctx.stroke();
+  }
+}
+
+function redraw() {
+  if (!pending) {
+    pending = true;
+    requestAnimationFrame(draw);
+  }
+}
+
+function nearest(mx, my) {
+  let best = -1, bestDist = 100;
+  for (let i = 0; i < nodes.length; i++) {
+    const dx = sx(nodes[i]) - mx, dy = sy(nodes[i]) - my;
+    const d = dx * dx + dy * dy;
+    if (d < bestDist) { best = i; bestDist = d; }
+  }
+  return best;
+}
+
+let drag = null;
+canvas.addEventListener('mousedown', e => { drag = [e.offsetX, e.offsetY]; canvas.style.cursor = 'grabbing'; });
+window.addEventListener('mouseup', () => { drag = null; canvas.style.cursor = 'grab'; });
+canvas.addEventListener('mousemove', e => {
+  if (drag) {
+    panX += e.offsetX - drag[0];
+    panY += e.offsetY - drag[1];
+    drag = [e.offsetX, e.offsetY];
+    redraw();
+    return;
+  }
+  const i = nearest(e.offsetX, e.offsetY);
+  if (i !== hovered) {
+    hovered = i;
+    redraw();
+  }
+  if (i >= 0) {
+    const n = nodes[i];
+    tip.textContent = `${n.id} (${n.type}${n.size > 1 ? ', ' + n.size + ' nodes' : ''}, ${n.degree} references)`;
+    tip.style.left = (e.offsetX + 12) + 'px';
+    tip.style.top = (e.offsetY + 12) + 'px';
+    tip.style.display = 'block';
+  } else {
+    tip.style.display = 'none';
+  }
+});
+canvas.addEventListener('mouseleave', () => { tip.style.display = 'none'; hovered = -1; redraw(); });
+canvas.addEventListener('wheel', e => {
+  e.preventDefault();
+  const factor = Math.exp(-e.deltaY * 0.0015);
+  panX = e.offsetX - (e.offsetX - panX) * factor;
+  panY = e.offsetY - (e.offsetY - panY) * factor;
+  scale *= factor;
+  redraw();
+}, {passive: false});
+canvas.addEventListener('dblclick', resize);
+window.addEventListener('resize', resize);
+resize();
+</script>
+'''
+
+
+def render_network(view, height=600):
+    # Embed the canvas for `view`; double-click the canvas to reset the zoom
+    html = (TEMPLATE
+            .replace('__HEIGHT__', str(int(height)))
+            .replace('__COLORS__', json.dumps(NODE_COLORS))
+            .replace('__VIEW__', json.dumps(view, separators=(',', ':')).replace('</', '<\\/')))
+    components.html(html, height=int(height) + 10)